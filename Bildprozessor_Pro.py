@@ -1,11 +1,102 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-from PIL import Image, ImageTk, ImageFilter, ImageOps, ImageChops, ImageEnhance
-from pdf2image import convert_from_path  # Für PDF-Unterstützung
+from PIL import Image, ImageFilter, ImageOps, ImageChops, ImageEnhance, ImageStat
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import argparse
+import functools
+import hashlib
+import importlib.util
+import io
+import itertools
 import json
+import multiprocessing
 import os
+import queue
+import signal
 import subprocess
 import sys
+import threading
+import time
+import tracemalloc
+
+# Langsame oder selten gebrauchte Module (pdf2image, numpy, ImageTk, http.server, sqlite3)
+# werden erst bei Bedarf geladen, damit das Fenster schneller erscheint.
+np = None  # numpy, optional und nur für die NumPy-Engine, siehe load_numpy
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+STARTUP_MARKS = [("Importe", time.perf_counter())]  # Zeitpunkte für --startup-profile
+
+
+def startup_mark(name):
+    STARTUP_MARKS.append((name, time.perf_counter()))
+
+
+def process_age():
+    """Sekunden seit dem Start des Prozesses oder None, wenn das System es nicht verrät.
+    Damit zählen Interpreterstart und Importe mit."""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            from ctypes import wintypes
+            times = [wintypes.FILETIME() for _ in range(4)]
+            kernel32 = ctypes.windll.kernel32
+            if not kernel32.GetProcessTimes(kernel32.GetCurrentProcess(), *map(ctypes.byref, times)):
+                return None
+            # FILETIME zählt 100 ns seit 1601
+            created = ((times[0].dwHighDateTime << 32) | times[0].dwLowDateTime) / 1e7 - 11644473600
+            return time.time() - created
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def report_startup(file_path="-"):
+    """Gibt die Startzeiten aus; mit file_path wird zusätzlich eine JSON-Zeile angehängt,
+    um die Zeit bis zum ersten Fenster über mehrere Versionen zu verfolgen. Gemessen wird ab
+    Prozessstart, wo das System ihn liefert, sonst erst ab dem Ende der Importe."""
+    age = process_age()
+    if age is None:
+        start, marks = STARTUP_MARKS[0][1], STARTUP_MARKS[1:]
+    else:
+        start, marks = time.perf_counter() - age, STARTUP_MARKS
+    if file_path == "-" and (getattr(sys, "frozen", False) or sys.stdout is None):
+        # Die mit -w gepackte .exe hat keine Konsole, die Zeiten landen dann neben ihr
+        file_path = os.path.join(get_program_path(), "startzeit.jsonl")
+    if sys.stdout is not None:
+        previous = start
+        for name, mark in marks:
+            print(f"{name:30s} {(mark - previous) * 1000:8.1f} ms  (gesamt {(mark - start) * 1000:8.1f} ms)")
+            previous = mark
+    if file_path and file_path != "-":
+        with open(file_path, "a") as f:
+            f.write(json.dumps({"timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                                "frozen": bool(getattr(sys, "frozen", False)),
+                                "marks_ms": {name: (mark - start) * 1000 for name, mark in marks}}) + "\n")
+
+
+def load_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+
+# pdf2image wird erst beim ersten PDF importiert
+def convert_from_path(*args, **kwargs):
+    from pdf2image import convert_from_path as convert
+    return convert(*args, **kwargs)
+
+
+def pdfinfo_from_path(*args, **kwargs):
+    from pdf2image import pdfinfo_from_path as pdfinfo
+    return pdfinfo(*args, **kwargs)
 
 
 def get_program_path():
@@ -16,6 +107,1510 @@ def get_program_path():
     else:
         return os.path.dirname(os.path.abspath(__file__))
 
+
+# 20 Filteroptionen – u.a. Mindestfilter: Negativ, Multiplikation, Helligkeit
+FILTER_OPTIONS = [
+    "Negativ",
+    "Multiplikation",
+    "Helligkeit",
+    "Kontrast",
+    "Schärfen",
+    "Weichzeichnen",
+    "Graustufen",
+    "Sepia",
+    "Posterize",
+    "Solarize",
+    "Kantenerkennung",
+    "Emboss",
+    "Edge Enhance",
+    "Detail",
+    "Smooth",
+    "Binarize",
+    "Gamma Correction",
+    "Adaptive Threshold",
+    "Color Boost",
+    "Custom"
+]
+
+
+def apply_filter(img, filter_name, strength=1.0, scale=1.0, stats=None):
+    """Wendet einen einzelnen Filter an. Fehler werden an den Aufrufer weitergereicht,
+    damit GUI und Batch-Betrieb sie unterschiedlich behandeln können.
+    scale gibt das Verhältnis zur Originalauflösung an (Vorschau), damit radiusabhängige
+    Filter auf der verkleinerten Vorschau denselben Eindruck ergeben.
+    stats ist für die Filter aus GLOBAL_FILTERS das Histogramm des ganzen Bildes, wenn img
+    nur eine Kachel davon ist (siehe process_tiled)."""
+    if filter_name == "Negativ":
+        blend_factor = min(max(strength, 0), 1)
+        inverted = ImageOps.invert(img)
+        return Image.blend(img, inverted, blend_factor)
+    elif filter_name == "Multiplikation":
+        blend_factor = min(max(strength, 0), 1)
+        overlay_value = int(255 * blend_factor)
+        overlay = Image.new(img.mode, img.size, (overlay_value,) * len(img.getbands()))
+        return ImageChops.multiply(img, overlay)
+    elif filter_name == "Helligkeit":
+        enhancer = ImageEnhance.Brightness(img)
+        effect = enhancer.enhance(2.0)
+        return Image.blend(img, effect, strength)
+    elif filter_name == "Kontrast":
+        if stats is None:
+            effect = ImageEnhance.Contrast(img).enhance(2.0)
+        else:
+            # Gleiche Rechnung wie ImageEnhance.Contrast, aber mit dem Mittelwert des ganzen Bildes
+            mean = int(ImageStat.Stat(stats).mean[0] + 0.5)
+            degenerate = Image.new("L", img.size, mean).convert(img.mode)
+            effect = Image.blend(degenerate, img, 2.0)
+        return Image.blend(img, effect, strength)
+    elif filter_name == "Schärfen":
+        enhancer = ImageEnhance.Sharpness(img)
+        effect = enhancer.enhance(2.0)
+        return Image.blend(img, effect, strength)
+    elif filter_name == "Weichzeichnen":
+        effect = img.filter(ImageFilter.GaussianBlur(radius=5 * scale))
+        return Image.blend(img, effect, strength)
+    elif filter_name == "Graustufen":
+        blend_factor = min(max(strength, 0), 1)
+        gray = img.convert("L").convert(img.mode)
+        return Image.blend(img, gray, blend_factor)
+    elif filter_name == "Sepia":
+        # Einziger Filter, der Farbe erzeugt: Graustufenbilder werden hier zu RGB
+        blend_factor = min(max(strength, 0), 1)
+        gray = img.convert("L")
+        sepia = ImageOps.colorize(gray, "#704214", "#C0A080")
+        return Image.blend(img.convert("RGB"), sepia, blend_factor)
+    elif filter_name == "Posterize":
+        bits = max(1, min(8, int(round((1 - strength) * 7) + 1)))
+        return ImageOps.posterize(img, bits)
+    elif filter_name == "Solarize":
+        threshold = int((1 - strength) * 255)
+        return ImageOps.solarize(img, threshold=threshold)
+    elif filter_name == "Kantenerkennung":
+        blend_factor = min(max(strength, 0), 1)
+        effect = img.filter(ImageFilter.FIND_EDGES)
+        return Image.blend(img, effect, blend_factor)
+    elif filter_name == "Emboss":
+        blend_factor = min(max(strength, 0), 1)
+        effect = img.filter(ImageFilter.EMBOSS)
+        return Image.blend(img, effect, blend_factor)
+    elif filter_name == "Edge Enhance":
+        blend_factor = min(max(strength, 0), 1)
+        effect = img.filter(ImageFilter.EDGE_ENHANCE)
+        return Image.blend(img, effect, blend_factor)
+    elif filter_name == "Detail":
+        blend_factor = min(max(strength, 0), 1)
+        effect = img.filter(ImageFilter.DETAIL)
+        return Image.blend(img, effect, blend_factor)
+    elif filter_name == "Smooth":
+        blend_factor = min(max(strength, 0), 1)
+        effect = img.filter(ImageFilter.SMOOTH)
+        return Image.blend(img, effect, blend_factor)
+    elif filter_name == "Binarize":
+        blend_factor = min(max(strength, 0), 1)
+        gray = img.convert("L")
+        effect = gray.point(BINARIZE_LUT).convert(img.mode)
+        return Image.blend(img, effect, blend_factor)
+    elif filter_name == "Gamma Correction":
+        gamma = 2.0
+        inv_gamma = 1.0 / gamma
+        table = [int((i / 255.0) ** inv_gamma * 255) for i in range(256)]
+        effect = img.point(table * len(img.getbands()))
+        blend_factor = min(max(strength, 0), 1)
+        return Image.blend(img, effect, blend_factor)
+    elif filter_name == "Adaptive Threshold":
+        # Lokale Schwelle: Pixel ist weiß, wenn er heller ist als (1 - k) * Mittelwert seines
+        # Fensters. BoxBlur rechnet den Mittelwert mit laufenden Summen, die Kosten je Pixel
+        # hängen also nicht von der Fenstergröße ab.
+        radius, k = adaptive_threshold_params(strength, scale)
+        gray = img.convert("L")
+        threshold = gray.filter(ImageFilter.BoxBlur(radius)).point(adaptive_threshold_lut(k))
+        # gray - threshold + 128 > 128 genau dann, wenn gray > threshold
+        effect = ImageChops.subtract(gray, threshold, offset=128).point(BINARIZE_LUT)
+        return effect.convert(img.mode)
+    elif filter_name == "Color Boost":
+        enhancer = ImageEnhance.Color(img)
+        effect = enhancer.enhance(2.0)
+        blend_factor = min(max(strength, 0), 1)
+        return Image.blend(img, effect, blend_factor)
+    elif filter_name == "Custom":
+        return img.copy()
+    else:
+        return img.copy()
+
+
+BINARIZE_LUT = [255 if x > 128 else 0 for x in range(256)]
+
+
+def adaptive_threshold_params(strength, scale=1.0):
+    """Fensterradius und k für Adaptive Threshold. Stärke 0 ergibt ein Fenster von 10 Pixeln
+    Radius und k = 0.05, Stärke 1 ein Fenster von 60 Pixeln und k = 0.20 – größere Fenster
+    gleichen ungleichmäßige Ausleuchtung aus, größeres k unterdrückt Rauschen und Schatten.
+    Der Radius gilt für die Originalauflösung und wird mit scale auf die Vorschau umgerechnet."""
+    strength = min(max(strength, 0), 1)
+    radius = max(1, int(round((10 + 50 * strength) * scale)))
+    return radius, 0.05 + 0.15 * strength
+
+
+@functools.lru_cache(maxsize=128)
+def adaptive_threshold_lut(k):
+    """Schwelle je lokalem Mittelwert: (1 - k) * Mittelwert."""
+    return [int(mean * (1 - k)) for mean in range(256)]
+
+
+def active_layers(layer_settings):
+    """Liefert die aktiven Ebenen aus dem settings.json-Format als Liste von (Filter, Stärke)."""
+    layers = []
+    for setting in sorted(layer_settings, key=lambda s: s.get("layer", 0)):
+        if setting.get("enabled", False):
+            layers.append((setting.get("filter", FILTER_OPTIONS[0]), setting.get("strength", 1.0)))
+    return layers
+
+
+# Reine Punktfilter: jeder Kanalwert hängt nur von sich selbst ab, deshalb lassen sich
+# aufeinanderfolgende Filter dieser Art samt Überblendung zu einer Lookup-Tabelle verschmelzen.
+# Binarize gehört nicht dazu, weil es über convert("L") alle drei Kanäle mischt.
+POINT_FILTERS = {
+    "Negativ",
+    "Multiplikation",
+    "Helligkeit",
+    "Posterize",
+    "Solarize",
+    "Gamma Correction",
+}
+
+FUSED_LUT = "LUT"  # Name eines Schritts, der eine verschmolzene Lookup-Tabelle anwendet
+
+
+@functools.lru_cache(maxsize=128)
+def point_filter_lut(run):
+    """Berechnet die Lookup-Tabelle (256 Werte je Kanal) für eine Folge von Punktfiltern.
+    Die Filter werden dazu auf einen Graukeil 0..255 angewendet, dadurch ist das Ergebnis
+    bitgenau identisch mit der einzelnen Ausführung über Image.blend."""
+    ramp = Image.new("RGB", (256, 1))
+    ramp.putdata([(v, v, v) for v in range(256)])
+    for filter_name, strength in run:
+        ramp = apply_filter(ramp, filter_name, strength)
+    table = []
+    for band in ramp.split():
+        table.extend(band.tobytes())
+    return table
+
+
+def compile_layer_groups(layers):
+    """Wie compile_layers, liefert aber zu jedem Schritt zusätzlich die Anzahl der Ebenen,
+    die nach diesem Schritt abgearbeitet sind: [(Schritt, Ende), ...]."""
+    groups = []
+    run = []
+    for index, (filter_name, strength) in enumerate(layers):
+        if filter_name in POINT_FILTERS:
+            run.append((filter_name, strength))
+            continue
+        if run:
+            groups.append(((FUSED_LUT, point_filter_lut(tuple(run))), index))
+            run = []
+        groups.append(((filter_name, strength), index + 1))
+    if run:
+        groups.append(((FUSED_LUT, point_filter_lut(tuple(run))), len(layers)))
+    return groups
+
+
+def compile_layers(layers):
+    """Übersetzt die Ebenen (Filter, Stärke) in Verarbeitungsschritte. Läufe benachbarter
+    Punktfilter werden zu einem (FUSED_LUT, Tabelle)-Schritt zusammengefasst, alle anderen
+    Filter bleiben unverändert und unterbrechen den Lauf."""
+    return [step for step, _ in compile_layer_groups(layers)]
+
+
+def apply_step(img, step, scale=1.0, stats=None):
+    """Führt einen Schritt aus compile_layers aus."""
+    filter_name, value = step
+    if filter_name == FUSED_LUT:
+        # Die Tabelle gilt für RGB; bei Graustufen genügt der erste Kanal (alle drei sind gleich)
+        return img.point(value if img.mode == "RGB" else value[:256])
+    return apply_filter(img, filter_name, value, scale, stats)
+
+
+def apply_layers(img, layers, scale=1.0, profiler=None, pool=None):
+    """Wendet die Ebenen (Filter, Stärke) nacheinander an – wie update_image in der GUI.
+    Mit pool (StripPool) wird jeder Schritt in Streifen auf mehrere Threads verteilt."""
+    apply = pool.apply if pool else apply_step
+    if profiler:
+        apply = profiler.wrap(apply)
+    for step in compile_layers(layers):
+        img = apply(img, step, scale)
+    return img
+
+
+def image_bytes(img):
+    """Pixelspeicher von img: Pillow legt je Pixel 1 bzw. 4 Byte ab."""
+    return img.width * img.height * (1 if img.mode in ("1", "L", "P") else 4)
+
+
+# Pixelbytes, die StripPool.apply im aufrufenden Thread für Streifen angelegt hat; je Thread,
+# damit parallele Render- und Export-Threads sich nicht gegenseitig mitzählen
+strip_allocations = threading.local()
+
+
+class LayerProfiler:
+    """Zeichnet Dauer, Ein-/Ausgabegröße und angelegten Bildspeicher je Schritt auf.
+
+    Als Bildspeicher zählen das Ergebnis des Schritts bzw. beim StripPool alle Streifen samt
+    zusammengesetztem Ergebnis; Zwischenbilder innerhalb eines Filters sind nicht enthalten.
+
+    Die Ereignisse werden in einem begrenzten Ringpuffer gehalten und lassen sich als
+    Chrome-Trace (chrome://tracing, Perfetto) exportieren. frame ordnet Ereignisse einem
+    Rendervorgang zu, in der GUI ist das die Generationsnummer des RenderWorker.
+    """
+
+    def __init__(self, max_events=20000):
+        self.events = deque(maxlen=max_events)
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+
+    def record(self, name, start, end, category="filter", frame=0, img_in=None, img_out=None,
+               allocated_bytes=None):
+        args = {"frame": frame}
+        if img_in is not None:
+            args["input"] = f"{img_in.width}x{img_in.height} {img_in.mode}"
+        if img_out is not None:
+            args["output"] = f"{img_out.width}x{img_out.height} {img_out.mode}"
+        if allocated_bytes is not None:
+            args["allocated_bytes"] = allocated_bytes
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self.origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with self.lock:
+            self.events.append(event)
+
+    @contextmanager
+    def measure(self, name, category="display", frame=0, img_in=None):
+        start = time.perf_counter()
+        yield
+        self.record(name, start, time.perf_counter(), category, frame, img_in)
+
+    def wrap(self, apply, frame=0):
+        """Liefert eine Variante von apply(img, step, scale), die jeden Schritt aufzeichnet."""
+        def timed(img, step, scale):
+            strip_allocations.bytes = 0
+            start = time.perf_counter()
+            result = apply(img, step, scale)
+            end = time.perf_counter()
+            allocated = strip_allocations.bytes or (image_bytes(result) if result is not img else 0)
+            self.record(step[0], start, end, "filter", frame, img, result, allocated)
+            return result
+        return timed
+
+    def record_engine(self, engine, start, frame=0, img_in=None):
+        """Überträgt die Schrittzeiten einer NumpyEngine (layer_times) ab start. Die Engine
+        rechnet auf vorab angelegten Puffern, neuer Bildspeicher fällt je Schritt nicht an."""
+        for name, seconds in engine.layer_times:
+            self.record(name, start, start + seconds, "numpy", frame, img_in, allocated_bytes=0)
+            start += seconds
+
+    def frame_events(self, frame):
+        with self.lock:
+            return [event for event in self.events if event["args"]["frame"] == frame]
+
+    def export_chrome_trace(self, file_path):
+        with self.lock:
+            events = list(self.events)
+        with open(file_path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+class LayerCache:
+    """LRU-Speicher für Zwischenergebnisse des Filterstapels.
+
+    Schlüssel ist (Bildkennung, Maßstab, Ebenen bis einschließlich dieses Schritts). Ändert
+    sich nur Ebene k, werden die Ergebnisse der Ebenen davor wiederverwendet und nur ab k
+    neu gerechnet. Der Speicher wird über max_bytes begrenzt, die ältesten Einträge fliegen zuerst.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()  # GUI-Thread und Render-Thread greifen gleichzeitig zu
+
+    @staticmethod
+    def image_bytes(img):
+        return img.width * img.height * len(img.getbands())
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def get(self, key):
+        with self.lock:
+            img = self.entries.get(key)
+            if img is not None:
+                self.entries.move_to_end(key)
+            return img
+
+    def put(self, key, img):
+        size = self.image_bytes(img)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.current_bytes -= self.image_bytes(self.entries.pop(key))
+            self.entries[key] = img
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, old = self.entries.popitem(last=False)
+                self.current_bytes -= self.image_bytes(old)
+
+    def render(self, image_key, img, layers, scale=1.0, apply=apply_step):
+        """Wendet layers auf img an und nutzt dabei den längsten bereits berechneten Präfix.
+        Gezählt wird je Schritt: aus dem Speicher geholt (Treffer) oder neu berechnet (Fehlschlag)."""
+        layers = tuple(layers)
+        groups = compile_layer_groups(layers)
+        start = 0
+        for index in range(len(groups), 0, -1):
+            cached = self.get((image_key, scale, layers[:groups[index - 1][1]]))
+            if cached is not None:
+                img = cached
+                start = index
+                break
+        with self.lock:
+            self.hits += start
+        for step, end in groups[start:]:
+            img = apply(img, step, scale)
+            with self.lock:
+                self.misses += 1
+            self.put((image_key, scale, layers[:end]), img)
+        return img
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class RenderCancelled(Exception):
+    """Wird im Render-Thread ausgelöst, wenn inzwischen ein neuerer Auftrag vorliegt."""
+
+
+class RenderWorker:
+    """Rendert den Filterstapel in einem Hintergrund-Thread.
+
+    Es zählt immer nur der neueste Auftrag: schnell aufeinanderfolgende Schieberegler-Ereignisse
+    überschreiben den wartenden Auftrag, eine laufende, veraltete Berechnung wird zwischen zwei
+    Schritten abgebrochen. Fertige Ergebnisse landen in results und werden vom Tk-Hauptthread
+    abgeholt, da Tk selbst nicht threadsicher ist.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.numpy_engine = None  # wird im Render-Thread angelegt, die Puffer gehören nur ihm
+        self.profiler = None  # optionaler LayerProfiler
+        self.pool = None  # optionaler StripPool für die Streifen-Parallelisierung
+        self.condition = threading.Condition()
+        self.pending = None
+        self.generation = 0
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="RenderWorker", daemon=True)
+        self.thread.start()
+
+    def submit(self, image_key, img, layers, scale=1.0, engine="Pillow"):
+        """Stellt einen Auftrag ein und gibt seine Generationsnummer zurück."""
+        with self.condition:
+            self.generation += 1
+            self.pending = (self.generation, image_key, img, tuple(layers), scale, engine, time.perf_counter())
+            self.condition.notify()
+            return self.generation
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+                job = self.pending
+                self.pending = None
+            generation, image_key, img, layers, scale, engine, submitted = job
+
+            def check():
+                if generation != self.generation:
+                    raise RenderCancelled()
+
+            def apply(img, step, scale):
+                check()
+                if self.pool:
+                    return self.pool.apply(img, step, scale)
+                return apply_step(img, step, scale)
+
+            if self.profiler:
+                apply = self.profiler.wrap(apply, generation)
+            try:
+                if engine == "NumPy":
+                    if self.numpy_engine is None:
+                        self.numpy_engine = NumpyEngine()
+                    start = time.perf_counter()
+                    result = self.numpy_engine.render(img, layers, scale, check)
+                    if self.profiler:
+                        self.profiler.record_engine(self.numpy_engine, start, generation, img)
+                else:
+                    result = self.cache.render(image_key, img, layers, scale, apply)
+            except RenderCancelled:
+                continue
+            except Exception as e:
+                self.results.put((generation, None, scale, str(e), 0.0))
+                continue
+            self.results.put((generation, result, scale, None, time.perf_counter() - submitted))
+
+
+RENDER_POLL_MS = 15  # Abfrageintervall des Hauptthreads für fertige Renderergebnisse
+
+PREVIEW_HEIGHT = 480  # Höhe der Bild-Canvas, darauf wird die Vorschau verkleinert
+
+
+def make_preview(img, max_height=PREVIEW_HEIGHT):
+    """Verkleinert img einmalig auf Canvas-Höhe. Gibt (Vorschau, Maßstab) zurück."""
+    if img.height <= max_height:
+        return img, 1.0
+    scale = max_height / img.height
+    size = (max(1, round(img.width * scale)), max_height)
+    return img.resize(size, Image.BILINEAR, reducing_gap=2.0), scale
+
+
+MIN_ZOOM = 0.05
+MAX_ZOOM = 8.0
+
+
+class ImagePyramid:
+    """Mipmap-Stufen eines Bildes (1, 1/2, 1/4, ...), die erst bei Bedarf berechnet werden.
+
+    region liefert nur den sichtbaren Ausschnitt in der gewünschten Vergrößerung und nimmt
+    dafür die kleinste Stufe, die noch mindestens so fein ist wie die Anzeige.
+    """
+
+    def __init__(self, img):
+        self.levels = [img]
+        self.width, self.height = img.size
+
+    def level(self, factor):
+        """Gibt (Stufenbild, Maßstab der Stufe) für die Vergrößerung factor zurück."""
+        index = 0
+        while factor <= 0.5 ** (index + 1) and min(self.levels[index].size) > 1:
+            index += 1
+            if index == len(self.levels):
+                self.levels.append(self.levels[-1].reduce(2))
+        return self.levels[index], 0.5 ** index
+
+    def region(self, factor, box):
+        """Ausschnitt box (links, oben, rechts, unten) in Anzeigekoordinaten bei Vergrößerung factor."""
+        level, level_scale = self.level(factor)
+        ratio = factor / level_scale
+        left, top, right, bottom = box
+        source_box = (left / ratio, top / ratio,
+                      min(level.width, right / ratio), min(level.height, bottom / ratio))
+        # Beim Hineinzoomen einzelne Pixel scharf zeigen, beim Verkleinern glätten
+        resample = Image.NEAREST if ratio > 1 else Image.BILINEAR
+        return level.resize((max(1, right - left), max(1, bottom - top)), resample, box=source_box)
+
+
+# ---------------------------------------------------------------------------
+# Graustufen und 1-Bit
+# ---------------------------------------------------------------------------
+
+TIFF_EXTENSIONS = (".tif", ".tiff")
+
+
+def grayscale_image(img):
+    """Liefert img als "L", wenn es keine Farbe enthält (auch RGB-Scans mit drei gleichen
+    Kanälen, das ist verlustfrei), sonst None."""
+    if img.mode in ("1", "L", "LA"):
+        return img.convert("L")
+    rgb = img.convert("RGB")
+    red, green, blue = rgb.split()
+    if ImageChops.difference(red, green).getbbox() or ImageChops.difference(green, blue).getbbox():
+        return None
+    return red  # bei R = G = B ist convert("L") genau dieser Kanal
+
+
+def working_image(img):
+    """Bringt ein geladenes Bild in den Arbeitsmodus der Filter: Vorlagen ohne Farbe (Scans,
+    Faxe, Kassenbons) bleiben "L" und brauchen so ein Drittel von Speicher und Rechenzeit,
+    alles andere wird RGB."""
+    gray = grayscale_image(img)
+    return gray if gray is not None else img.convert("RGB")
+
+
+def bilevel_image(img):
+    """Liefert img als 1-Bit-Bild, wenn es nur aus Schwarz und Weiß besteht, sonst None."""
+    if img.mode == "1":
+        return img
+    gray = grayscale_image(img) if img.mode != "L" else img
+    if gray is None or any(gray.histogram()[1:255]):
+        return None
+    return gray.convert("1", dither=Image.Dither.NONE)
+
+
+# Kompression je Format: höhere Stufe = kleinere Dateien, aber langsameres Kodieren.
+# Die Standardwerte entsprechen dem bisherigen Verhalten (Pillow-Vorgaben, TIFF mit LZW).
+DEFAULT_EXPORT_OPTIONS = {
+    "png_level": 6,       # zlib-Stufe 0 (schnell, groß) bis 9 (langsam, klein)
+    "jpeg_quality": 75,   # 1 bis 95, gilt auch für Graustufen- und Farbseiten in PDFs
+    "tiff_codec": "tiff_lzw",
+}
+TIFF_CODECS = ("tiff_lzw", "tiff_adobe_deflate", "packbits", "raw")
+PAGE_FORMATS = (".pdf",) + TIFF_EXTENSIONS  # Formate mit mehreren Seiten pro Datei
+
+
+def export_options(options=None):
+    """Vollständige Exportoptionen: fehlende Werte aus DEFAULT_EXPORT_OPTIONS."""
+    merged = dict(DEFAULT_EXPORT_OPTIONS)
+    merged.update(options or {})
+    if merged["tiff_codec"] not in TIFF_CODECS:
+        merged["tiff_codec"] = DEFAULT_EXPORT_OPTIONS["tiff_codec"]
+    return merged
+
+
+def encoder_params(extension, bilevel, options=None, dpi=None):
+    """Parameter für Image.save je Dateiendung. Reines Schwarz/Weiß geht in TIFF immer als
+    CCITT Group 4 (in PDFs macht Pillow das bei 1-Bit-Seiten von selbst)."""
+    options = export_options(options)
+    if extension == ".png":
+        return {"compress_level": options["png_level"]}
+    if extension in (".jpg", ".jpeg"):
+        return {"quality": options["jpeg_quality"]}
+    if extension in TIFF_EXTENSIONS:
+        params = {"compression": "group4" if bilevel else options["tiff_codec"]}
+        if dpi:
+            params["dpi"] = (dpi, dpi)
+        return params
+    if extension == ".pdf":
+        # Ohne Auflösung nimmt Pillow 72 DPI an, eine 200-DPI-Seite wäre dann fast dreimal zu groß
+        params = {"resolution": float(dpi or 72)}
+        if not bilevel:
+            params["quality"] = options["jpeg_quality"]
+        return params
+    return {}
+
+
+def output_extension(file_path, output_format=None):
+    return "." + output_format if output_format else os.path.splitext(file_path)[1].lower()
+
+
+def save_output(img, file_path, output_format=None, options=None, dpi=None):
+    """Speichert ein Ergebnis. Reines Schwarz/Weiß wird als 1-Bit abgelegt – in TIFF mit
+    CCITT Group 4, wie bei Faxen üblich –, die übrige Kompression kommt aus options
+    (siehe DEFAULT_EXPORT_OPTIONS). output_format ("png", "tif", ...) ist nötig, wenn
+    file_path ein Dateiobjekt ist."""
+    extension = output_extension(file_path, output_format)
+    image_format = None
+    if output_format:
+        image_format = "TIFF" if extension in TIFF_EXTENSIONS else Image.registered_extensions()[extension]
+    bilevel = None
+    if extension in PAGE_FORMATS or extension == ".png":
+        bilevel = bilevel_image(img)
+        if bilevel is not None:
+            img = bilevel
+    img.save(file_path, format=image_format, **encoder_params(extension, bilevel is not None, options, dpi))
+
+
+def pdf_image_stream(img, quality):
+    """Kodiert eine Seite für ein PDF-Bildobjekt: 1-Bit als CCITT Group 4 (wie Pillows
+    PDF-Plugin über ein TIFF mit einem einzigen Streifen), sonst als JPEG.
+    Gibt (Datenstrom, Modus) zurück, den Modus braucht pdf_image_dict."""
+    output = io.BytesIO()
+    if img.mode == "1":
+        img.save(output, "TIFF", compression="group4", strip_size=(img.width + 7) // 8 * img.height)
+        return output.getvalue()[8:], "1"
+    if img.mode not in ("L", "RGB"):
+        img = img.convert("RGB")
+    img.save(output, "JPEG", quality=quality)
+    return output.getvalue(), img.mode
+
+
+def pdf_image_dict(mode, width, height):
+    """Einträge des PDF-Bild-Dictionarys zu einem Datenstrom aus pdf_image_stream."""
+    from PIL import PdfParser
+    if mode == "1":
+        params = PdfParser.PdfDict(K=-1, BlackIs1=True, Columns=width, Rows=height)
+        return {"Filter": [PdfParser.PdfName("CCITTFaxDecode")], "DecodeParms": [params],
+                "BitsPerComponent": 1, "ColorSpace": PdfParser.PdfName("DeviceGray")}
+    return {"Filter": PdfParser.PdfName("DCTDecode"), "BitsPerComponent": 8,
+            "ColorSpace": PdfParser.PdfName("DeviceGray" if mode == "L" else "DeviceRGB")}
+
+
+def encode_page(img, extension, options=None, dpi=None):
+    """Kodiert eine Seite für PageWriter.add_encoded und liefert (Daten, Modus, Breite, Höhe):
+    bei TIFF eine vollständige einseitige TIFF-Datei, bei PDF den Bild-Datenstrom. Das Ergebnis
+    ist klein und lässt sich pickeln – der HTTP-Dienst kodiert so schon im Worker-Prozess."""
+    bilevel = bilevel_image(img)
+    if bilevel is not None:
+        img = bilevel
+    if extension in TIFF_EXTENSIONS:
+        output = io.BytesIO()
+        img.save(output, format="TIFF", **encoder_params(extension, bilevel is not None, options, dpi))
+        return output.getvalue(), img.mode, img.width, img.height
+    data, mode = pdf_image_stream(img, export_options(options)["jpeg_quality"])
+    return data, mode, img.width, img.height
+
+
+class PageWriter:
+    """Schreibt Seiten nacheinander in eine mehrseitige TIFF- oder PDF-Datei.
+
+    Jede Seite wird bei add sofort kodiert und geschrieben, es liegt also nie mehr als eine
+    Seite im Speicher. TIFF hängt über Pillows AppendingTiffWriter je Seite ein neues
+    Verzeichnis an; beim PDF kommen Bild, Inhalt und Seite sofort in die Datei, Seitenbaum und
+    Querverweistabelle erst bei close. (Pillows save_all braucht alle Seiten auf einmal, der
+    append-Modus liest bei jeder Seite die ganze Datei neu ein.) Die Kompression wird je Seite
+    gewählt: Schwarz/Weiß-Seiten als 1-Bit mit Group 4, die übrigen nach options.
+    Schon mit encode_page kodierte Seiten nimmt add_encoded an.
+    """
+
+    def __init__(self, file_path, output_format=None, options=None, dpi=None):
+        self.extension = output_extension(file_path, output_format)
+        if self.extension not in PAGE_FORMATS:
+            raise ValueError(f"Mehrseitig geht nur als PDF oder TIFF, nicht als {self.extension}")
+        self.options = export_options(options)
+        self.dpi = dpi
+        self.pages = 0
+        self.pixels = 0
+        self.tiff = self.pdf = None
+        if self.extension in TIFF_EXTENSIONS:
+            from PIL import TiffImagePlugin
+            self.tiff = TiffImagePlugin.AppendingTiffWriter(file_path, new=True)
+        else:
+            from PIL import PdfParser
+            if isinstance(file_path, str):
+                self.pdf = PdfParser.PdfParser(filename=file_path, mode="w+b")
+            else:
+                self.pdf = PdfParser.PdfParser(f=file_path)
+            self.pdf.start_writing()
+            self.pdf.write_header()
+            self.pdf.pages_ref = self.pdf.next_object_id(0)  # Seiten verweisen schon vorab darauf
+
+    def add(self, img):
+        self.add_encoded(encode_page(img, self.extension, self.options, self.dpi))
+
+    def add_encoded(self, page):
+        data, mode, width, height = page
+        if self.tiff is not None:
+            # AppendingTiffWriter passt die Offsets der angehängten Datei bei newFrame an
+            self.tiff.write(data)
+            self.tiff.newFrame()
+        else:
+            self._add_pdf_page(data, mode, width, height)
+        self.pages += 1
+        self.pixels += width * height
+
+    def _add_pdf_page(self, stream, mode, pixel_width, pixel_height):
+        from PIL import PdfParser
+        image_ref = self.pdf.write_obj(None, stream=stream, Type=PdfParser.PdfName("XObject"),
+                                       Subtype=PdfParser.PdfName("Image"), Width=pixel_width, Height=pixel_height,
+                                       **pdf_image_dict(mode, pixel_width, pixel_height))
+        # Seitengröße in Punkt (1/72 Zoll); ohne DPI wird wie bei Pillow 72 angenommen
+        width = pixel_width * 72.0 / (self.dpi or 72)
+        height = pixel_height * 72.0 / (self.dpi or 72)
+        contents_ref = self.pdf.write_obj(None, stream=b"q %f 0 0 %f 0 0 cm /image Do Q\n" % (width, height))
+        self.pdf.pages.append(self.pdf.write_page(
+            None, Resources=PdfParser.PdfDict(XObject=PdfParser.PdfDict(image=image_ref)),
+            MediaBox=[0, 0, width, height], Contents=contents_ref))
+
+    def close(self):
+        if self.tiff is not None:
+            self.tiff.close()
+            self.tiff = None
+        if self.pdf is not None:
+            from PIL import PdfParser
+            root_ref = self.pdf.write_obj(None, Type=PdfParser.PdfName("Catalog"), Pages=self.pdf.pages_ref)
+            self.pdf.write_obj(self.pdf.pages_ref, Type=PdfParser.PdfName("Pages"), Count=len(self.pdf.pages),
+                               Kids=self.pdf.pages)
+            self.pdf.write_xref_and_trailer(root_ref)
+            self.pdf.close()
+            self.pdf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export_document(pages, page_count, file_path, process, options=None, dpi=None, progress=None):
+    """Rechnet und speichert die page_count Seiten aus dem Iterator pages nacheinander:
+    process(Bild) liefert das Ergebnis, das sofort geschrieben wird, bevor die nächste Seite
+    gerastert wird. Mehrere Seiten gehen nur nach PDF/TIFF, eine Seite in jedes Format.
+    progress(fertige Seiten) wird nach jeder Seite aufgerufen.
+    Gibt (Seiten, Bytes, Megapixel, Sekunden) für die Durchsatzanzeige zurück."""
+    start = time.perf_counter()
+    if page_count == 1 and output_extension(file_path) not in PAGE_FORMATS:
+        result = process(next(iter(pages)))
+        save_output(result, file_path, options=options, dpi=dpi)
+        count, pixels = 1, result.width * result.height
+        if progress:
+            progress(1)
+    else:
+        with PageWriter(file_path, options=options, dpi=dpi) as writer:
+            for img in pages:
+                writer.add(process(img))
+                if progress:
+                    progress(writer.pages)
+        count, pixels = writer.pages, writer.pixels
+    return count, os.path.getsize(file_path), pixels / 1e6, time.perf_counter() - start
+
+
+def file_sha256(file_path):
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class PageCache:
+    """Persistenter Speicher für gerasterte PDF-Seiten auf der Festplatte.
+
+    Schlüssel ist der SHA-256 des Dateiinhalts zusammen mit Seite, DPI und Farbmodus – eine
+    umbenannte oder kopierte PDF wird also wiedererkannt, eine geänderte nicht. Die Seiten
+    liegen unkomprimiert als PNM, das sich schneller lesen lässt als PNG. Ist max_bytes
+    überschritten, werden die am längsten nicht benutzten Seiten gelöscht.
+    """
+
+    MAX_HASHES = 256  # gemerkte Prüfsummen; ein Überwachungsdienst sieht sonst unbegrenzt viele Dateien
+
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # (Pfad, Größe, Änderungszeit) -> SHA-256 als LRU, damit nicht jedes Mal gelesen wird
+        self.hashes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Laufende Schätzung der Belegung: Der Ordner (evtl. auf einem Netzlaufwerk) wird nur
+        # durchsucht, wenn sie max_bytes überschreitet, nicht bei jeder gespeicherten Seite.
+        # Seiten anderer Prozesse kommen erst beim nächsten Durchsuchen hinzu.
+        self.estimated_bytes = sum(size for _, size, _ in self._pages())
+
+    def file_hash(self, file_path):
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            digest = self.hashes.get(key)
+            if digest is not None:
+                self.hashes.move_to_end(key)
+                return digest
+        digest = file_sha256(file_path)
+        with self.lock:
+            self.hashes[key] = digest
+            while len(self.hashes) > self.MAX_HASHES:
+                self.hashes.popitem(last=False)
+        return digest
+
+    def _page_path(self, file_path, page, dpi, mode):
+        return os.path.join(self.directory, f"{self.file_hash(file_path)}_{page}_{dpi}_{mode}.pnm")
+
+    def _count_path(self, file_path):
+        return os.path.join(self.directory, self.file_hash(file_path) + ".json")
+
+    def _write_atomic(self, path, write):
+        # Erst unter temporärem Namen schreiben, damit parallele Batch-Prozesse nie halbe Dateien lesen
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        write(temp_path)
+        os.replace(temp_path, path)
+
+    def _pages(self):
+        """(Änderungszeit, Größe, Pfad) aller Seiten im Ordner; gerade gelöschte werden übersprungen."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pnm"):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def get(self, file_path, page, dpi, mode="RGB"):
+        path = self._page_path(file_path, page, dpi, mode)
+        try:
+            img = Image.open(path)
+            img.load()
+            os.utime(path)  # Änderungszeit dient als Zeitpunkt der letzten Benutzung
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return img
+
+    def put(self, file_path, page, dpi, img, mode="RGB"):
+        path = self._page_path(file_path, page, dpi, mode)
+        self._write_atomic(path, lambda temp_path: img.save(temp_path, format="PPM"))
+        with self.lock:
+            self.estimated_bytes += img.width * img.height * len(img.getbands())
+            full = self.estimated_bytes > self.max_bytes
+        if full:
+            self.evict()
+
+    def page_count(self, file_path):
+        try:
+            with open(self._count_path(file_path), "r") as f:
+                return json.load(f)["pages"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set_page_count(self, file_path, count):
+        def write(temp_path):
+            with open(temp_path, "w") as f:
+                json.dump({"pages": count}, f)
+        self._write_atomic(self._count_path(file_path), write)
+
+    def evict(self):
+        """Löscht die am längsten nicht benutzten Seiten, bis höchstens 90 % von max_bytes
+        belegt sind – so wird bei vollem Cache nicht nach jeder Seite erneut durchsucht –, und
+        danach die Seitenzahl-Dateien von PDFs, von denen keine Seite mehr im Cache liegt."""
+        entries = sorted(self._pages())
+        total = sum(size for _, size, _ in entries)
+        kept = []
+        for index, (mtime, size, path) in enumerate(entries):
+            if total <= self.max_bytes * 0.9:
+                kept = entries[index:]
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self.lock:
+            self.estimated_bytes = total
+        # Nur Seitenzahlen entfernen, die älter als jede verbliebene Seite sind – eine gerade
+        # geöffnete PDF, deren Seiten noch gerastert werden, behält ihre Datei.
+        oldest = kept[0][0] if kept else None
+        digests = {os.path.basename(path).split("_", 1)[0] for _, _, path in kept}
+        for name in os.listdir(self.directory):
+            if name.endswith(".json") and name[:-5] not in digests:
+                path = os.path.join(self.directory, name)
+                try:
+                    if oldest is None or os.stat(path).st_mtime < oldest:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def stats(self):
+        entries = self._pages()
+        return {"hits": self.hits, "misses": self.misses, "pages": len(entries),
+                "bytes": sum(size for _, size, _ in entries), "max_bytes": self.max_bytes}
+
+
+def pdf_page_count(file_path, poppler_path="", page_cache=None):
+    """Seitenzahl einer PDF, bei bekanntem Inhalt aus dem Seiten-Cache statt über pdfinfo."""
+    if page_cache:
+        count = page_cache.page_count(file_path)
+        if count is not None:
+            return count
+    count = pdfinfo_from_path(file_path, poppler_path=poppler_path or None)["Pages"]
+    if page_cache:
+        page_cache.set_page_count(file_path, count)
+    return count
+
+
+def rasterize_pdf_page(file_path, page, dpi=200, poppler_path="", page_cache=None, grayscale=False):
+    """Rastert eine einzelne PDF-Seite; bereits bekannte Seiten kommen aus page_cache.
+    Mit grayscale rastert Poppler direkt in Graustufen, sonst bleiben farblose Seiten
+    über working_image trotzdem "L"."""
+    mode = "L" if grayscale else "RGB"
+    if page_cache:
+        img = page_cache.get(file_path, page, dpi, mode)
+        if img is not None:
+            return img
+    img = working_image(convert_from_path(file_path, dpi=dpi, first_page=page, last_page=page,
+                                          poppler_path=poppler_path or None, grayscale=grayscale)[0])
+    if page_cache:
+        page_cache.put(file_path, page, dpi, img, mode)
+    return img
+
+
+class PdfDocument:
+    """Öffnet eine PDF-Datei seitenweise statt sie komplett zu rastern.
+
+    Die Seitenzahl kommt aus pdfinfo, gerastert wird nur die angeforderte Seite über
+    first_page/last_page. Die zuletzt benutzten Seiten bleiben in einem kleinen LRU-Speicher,
+    Nachbarseiten können im Hintergrund vorgeladen werden. Mit page_cache (PageCache) werden
+    schon einmal gerasterte Seiten von der Festplatte gelesen, ohne Poppler zu starten.
+    """
+
+    def __init__(self, file_path, poppler_path="", dpi=200, max_pages=6, page_cache=None, grayscale=False):
+        self.file_path = file_path
+        self.poppler_path = poppler_path or None
+        self.dpi = dpi
+        self.max_pages = max_pages
+        self.page_cache = page_cache
+        self.grayscale = grayscale
+        self.page_count = pdf_page_count(file_path, poppler_path, page_cache)
+        self.pages = OrderedDict()
+        self.pending = {}  # Seite -> Future der laufenden Vorab-Rasterung
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def _rasterize(self, page):
+        try:
+            img = rasterize_pdf_page(self.file_path, page, self.dpi, self.poppler_path, self.page_cache,
+                                     self.grayscale)
+            with self.lock:
+                self.pages[page] = img
+                self.pages.move_to_end(page)
+                while len(self.pages) > self.max_pages:
+                    self.pages.popitem(last=False)
+            return img
+        finally:
+            # Auch nach einem Fehler, sonst bekäme get_page für diese Seite immer wieder
+            # dieselbe gescheiterte Future statt neu zu rastern
+            with self.lock:
+                self.pending.pop(page, None)
+
+    def get_page(self, page):
+        """Liefert Seite page (ab 1) – aus dem Speicher, aus einer laufenden Vorab-Rasterung
+        oder frisch gerastert."""
+        with self.lock:
+            if page in self.pages:
+                self.pages.move_to_end(page)
+                return self.pages[page]
+            future = self.pending.get(page)
+        if future is not None:
+            return future.result()
+        return self._rasterize(page)
+
+    def iter_pages(self):
+        """Alle Seiten nacheinander, z.B. für den Export. Schon geladene Seiten werden
+        wiederverwendet, neu gerasterte aber nicht im LRU-Speicher gehalten."""
+        for page in range(1, self.page_count + 1):
+            with self.lock:
+                img = self.pages.get(page)
+            if img is None:
+                img = rasterize_pdf_page(self.file_path, page, self.dpi, self.poppler_path, self.page_cache,
+                                         self.grayscale)
+            yield img
+
+    def prefetch(self, page):
+        if not 1 <= page <= self.page_count:
+            return
+        with self.lock:
+            if page in self.pages or page in self.pending:
+                return
+            self.pending[page] = self.executor.submit(self._rasterize, page)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+def find_poppler_path(configured_path=""):
+    """Sucht den Poppler-Ordner: gebündelt, neben dem Programm oder der konfigurierte Pfad."""
+    if getattr(sys, 'frozen', False):
+        return os.path.join(sys._MEIPASS, "poppler_bin", "bin")
+    auto_path = os.path.join(get_program_path(), "poppler_bin", "bin")
+    if os.path.exists(auto_path):
+        return auto_path
+    if configured_path and os.path.exists(configured_path):
+        return configured_path
+    return ""
+
+
+# ---------------------------------------------------------------------------
+# Gekachelte Verarbeitung für sehr große Scans
+# ---------------------------------------------------------------------------
+
+# Filter, die eine Statistik über das ganze Bild brauchen, und der Modus ihres Histogramms
+GLOBAL_FILTERS = {
+    "Kontrast": "L",
+}
+
+# Nachbarschaft (in Pixeln) der 3x3-Filter; Weichzeichnen siehe filter_margin
+NEIGHBOURHOOD_FILTERS = {"Schärfen", "Kantenerkennung", "Emboss", "Edge Enhance", "Detail", "Smooth"}
+
+DEFAULT_TILE_MB = 256
+
+
+def gaussian_box_radius(radius, passes=3):
+    """Radius der Box-Filter, mit denen Pillow GaussianBlur annähert (siehe BoxBlur.c)."""
+    sigma2 = radius * radius / passes
+    length = (12.0 * sigma2 + 1.0) ** 0.5
+    lower = float(int((length - 1.0) / 2.0))
+    frac = (2 * lower + 1) * (lower * (lower + 1) - 3 * sigma2)
+    frac /= 6 * (sigma2 - (lower + 1) * (lower + 1))
+    return lower + frac
+
+
+def filter_margin(step, scale=1.0):
+    """Wie viele Pixel Rand ein Schritt um jede Kachel braucht, damit das Ergebnis exakt bleibt."""
+    filter_name = step[0]
+    if filter_name in NEIGHBOURHOOD_FILTERS:
+        return 1
+    if filter_name == "Weichzeichnen":
+        # Drei Box-Durchgänge, jeder liest radius+1 Pixel weit
+        return 3 * (int(gaussian_box_radius(5 * scale)) + 1)
+    if filter_name == "Adaptive Threshold":
+        return adaptive_threshold_params(step[1], scale)[0] + 1
+    return 0
+
+
+def tile_rows(img, memory_budget):
+    """Kachelhöhe, bei der die etwa vier gleichzeitig lebenden Zwischenbilder eines Schritts
+    ins Budget passen (Pillow legt RGB mit 4 Byte je Pixel ab)."""
+    return max(16, memory_budget // (img.width * 4 * 4))
+
+
+def needs_tiling(img, memory_budget):
+    return img.width * img.height * 4 * 4 > memory_budget
+
+
+def _run_tiled(img, steps, scale, stats, rows, consume):
+    """Schickt img in Streifen zu rows Zeilen durch steps und übergibt consume(y, Streifen)
+    den fertigen Kern ohne Überlappung."""
+    margin = sum(filter_margin(step, scale) for step in steps)
+    for top in range(0, img.height, rows):
+        bottom = min(top + rows, img.height)
+        crop_top = max(0, top - margin)
+        crop_bottom = min(img.height, bottom + margin)
+        tile = img.crop((0, crop_top, img.width, crop_bottom))
+        for index, step in enumerate(steps):
+            tile = apply_step(tile, step, scale, stats.get(index))
+        consume(top, tile.crop((0, top - crop_top, img.width, bottom - crop_top)))
+
+
+def stack_mode(img, layers):
+    """Modus des Ergebnisses von layers auf img: Graustufen bleiben "L", außer Sepia färbt ein."""
+    if img.mode == "L" and not any(filter_name == "Sepia" for filter_name, _ in layers):
+        return "L"
+    return "RGB"
+
+
+def process_tiled(img, layers, memory_budget=DEFAULT_TILE_MB * 1024 * 1024, scale=1.0, output=None):
+    """Wendet layers streifenweise an, sodass nie der ganze Stapel an Zwischenbildern in voller
+    Größe im Speicher liegt. Die Streifen überlappen um die Reichweite der Nachbarschaftsfilter;
+    Filter mit globaler Statistik bekommen vorab in einem eigenen Durchlauf das Histogramm des
+    ganzen Bildes. Das Ergebnis ist identisch mit apply_layers.
+    Jeder fertige Streifen wird sofort in output (oder ein neues Bild) eingefügt."""
+    steps = compile_layers(layers)
+    rows = tile_rows(img, memory_budget)
+    stats = {}
+    for index, step in enumerate(steps):
+        if step[0] not in GLOBAL_FILTERS:
+            continue
+        histogram_mode = GLOBAL_FILTERS[step[0]]
+        histogram = []
+
+        def add_histogram(top, tile):
+            if histogram_mode:
+                tile = tile.convert(histogram_mode)
+            counts = tile.histogram()
+            if not histogram:
+                histogram.extend(counts)
+            else:
+                histogram[:] = [a + b for a, b in zip(histogram, counts)]
+
+        _run_tiled(img, steps[:index], scale, stats, rows, add_histogram)
+        stats[index] = histogram
+    if output is None:
+        output = Image.new(stack_mode(img, layers), img.size)
+    _run_tiled(img, steps, scale, stats, rows, lambda top, tile: output.paste(tile, (0, top)))
+    return output
+
+
+class StripPool:
+    """Verteilt einzelne Schritte auf horizontale Streifen in einem Thread-Pool.
+
+    Pillow gibt in seinen C-Routinen (blend, filter, point, convert) den GIL frei, sodass die
+    Streifen echt parallel laufen. Nachbarschaftsfilter bekommen Überlappungszeilen
+    (filter_margin), Filter mit globaler Statistik das Histogramm des ganzen Bildes – das
+    Ergebnis ist daher identisch mit apply_step.
+    """
+
+    MIN_ROWS = 64  # kleinere Streifen lohnen den Verwaltungsaufwand nicht
+
+    def __init__(self, workers=None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+
+    def apply(self, img, step, scale=1.0):
+        if self.executor is None or img.height < 2 * self.MIN_ROWS:
+            return apply_step(img, step, scale)
+        stats = None
+        allocated = 0
+        if step[0] in GLOBAL_FILTERS:
+            histogram_mode = GLOBAL_FILTERS[step[0]]
+            source = img.convert(histogram_mode) if histogram_mode else img
+            stats = source.histogram()
+            allocated += image_bytes(source) if histogram_mode else 0
+        margin = filter_margin(step, scale)
+        count = min(self.workers, img.height // self.MIN_ROWS)
+        rows = -(-img.height // count)
+        img.load()  # vor dem gleichzeitigen Zugriff aus mehreren Threads
+
+        def run(top):
+            bottom = min(top + rows, img.height)
+            crop_top = max(0, top - margin)
+            crop_bottom = min(img.height, bottom + margin)
+            strip = img.crop((0, crop_top, img.width, crop_bottom))
+            tile = apply_step(strip, step, scale, stats)
+            result = tile.crop((0, top - crop_top, img.width, bottom - crop_top))
+            return result, image_bytes(strip) + image_bytes(tile) + image_bytes(result)
+
+        tops = range(0, img.height, rows)
+        tiles = list(self.executor.map(run, tops))
+        output = Image.new(tiles[0][0].mode, img.size)
+        for top, (tile, tile_bytes) in zip(tops, tiles):
+            output.paste(tile, (0, top))
+            allocated += tile_bytes
+        # Gezählt wird im aufrufenden Thread, den LayerProfiler.wrap misst
+        strip_allocations.bytes = getattr(strip_allocations, "bytes", 0) + allocated + image_bytes(output)
+        return output
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=False)
+
+
+# ---------------------------------------------------------------------------
+# NumPy-Engine
+# ---------------------------------------------------------------------------
+
+ENGINES = ("Pillow", "NumPy")
+
+# 3x3-Faltungen wie in PIL.ImageFilter, als (Kern, Teiler, Offset)
+CONVOLUTION_FILTERS = {
+    "Kantenerkennung": ImageFilter.FIND_EDGES,
+    "Emboss": ImageFilter.EMBOSS,
+    "Edge Enhance": ImageFilter.EDGE_ENHANCE,
+    "Detail": ImageFilter.DETAIL,
+    "Smooth": ImageFilter.SMOOTH,
+}
+
+
+@functools.lru_cache(maxsize=4)
+def sepia_luts():
+    """Die drei Kanal-Tabellen von ImageOps.colorize für den Sepia-Filter."""
+    ramp = Image.new("L", (256, 1))
+    ramp.putdata(range(256))
+    sepia = ImageOps.colorize(ramp, "#704214", "#C0A080")
+    return [np.asarray(band, dtype=np.uint8).reshape(256) for band in sepia.split()]
+
+
+def scratch_buffer(scratch, name, shape, dtype):
+    """Hilfspuffer aus dem Dict scratch, neu angelegt nur bei geänderter Form."""
+    key = (name, shape, dtype)
+    buffer = scratch.get(key) if scratch is not None else None
+    if buffer is None:
+        buffer = np.empty(shape, dtype=dtype)
+        if scratch is not None:
+            scratch[key] = buffer
+    return buffer
+
+
+def box_blur_axis(arr, radius, axis, out=None, scratch=None):
+    """Ein Box-Blur-Durchgang entlang axis mit gebrochenem Radius, Ränder werden fortgesetzt.
+    Rechnet mit denselben 24-Bit-Festkommagewichten wie Pillow, ganz in uint32: Die gewichtete
+    Summe ist höchstens 255 << 24 und passt gerade hinein. Die Zwischenpuffer kommen aus
+    scratch (siehe scratch_buffer) und werden in place gefüllt; das Ergebnis geht nach out."""
+    radius_int = int(radius)
+    ww = int((1 << 24) / (radius * 2 + 1))
+    fw = ((1 << 24) - (radius_int * 2 + 1) * ww) // 2
+    length = arr.shape[axis]
+    window = 2 * radius_int + 1
+
+    def span(start, stop):
+        return (slice(None),) * axis + (slice(start, stop),)
+
+    def resized(extra):
+        return arr.shape[:axis] + (length + extra,) + arr.shape[axis + 1:]
+
+    # Ränder fortsetzen, ohne np.pad jedes Mal ein neues Array anlegen zu lassen
+    padded = scratch_buffer(scratch, "padded", resized(window + 1), np.uint8)
+    padded[span(0, radius_int + 1)] = arr[span(0, 1)]
+    padded[span(radius_int + 1, radius_int + 1 + length)] = arr
+    padded[span(radius_int + 1 + length, None)] = arr[span(length - 1, length)]
+    # Präfixsummen mit führender Null: Fenstersumme = cumsum[i + window] - cumsum[i]
+    cumsum = scratch_buffer(scratch, "cumsum", resized(window + 2), np.uint32)
+    cumsum[span(0, 1)] = 0
+    np.cumsum(padded, axis=axis, dtype=np.uint32, out=cumsum[span(1, None)])
+    acc = scratch_buffer(scratch, "acc", arr.shape, np.uint32)
+    np.subtract(cumsum[span(1 + window, 1 + window + length)], cumsum[span(1, 1 + length)], out=acc)
+    acc *= np.uint32(ww)
+    # Die Präfixsummen sind verbraucht, ihr Anfang dient jetzt als Puffer für die Randgewichte
+    far = cumsum[span(0, length)]
+    for start in (0, window + 1):
+        np.multiply(padded[span(start, start + length)], np.uint32(fw), out=far)
+        acc += far
+    acc += np.uint32(1 << 23)
+    acc >>= 24
+    if out is None:
+        out = np.empty(arr.shape, dtype=np.uint8)
+    np.copyto(out, acc, casting="unsafe")
+    return out
+
+
+class NumpyEngine:
+    """Alternative zu apply_layers: das Bild wird einmal in ein NumPy-Array gewandelt und
+    der ganze Stapel läuft auf vorab angelegten Puffern. Erst das Endergebnis wird wieder
+    ein PIL-Bild. Rundung und Überblendung folgen Pillow (float32, abschneiden), sodass
+    die Ergebnisse bis auf wenige Tonwerte mit der Pillow-Engine übereinstimmen.
+    Graustufenbilder laufen einkanalig, solange kein Sepia im Stapel ist (siehe stack_mode).
+
+    Nach jedem Aufruf von render stehen die Laufzeiten je Schritt in layer_times und –
+    bei profile=True – der Speicherhöchststand in peak_bytes.
+    """
+
+    def __init__(self):
+        load_numpy()
+        self.shape = None
+        self.layer_times = []
+        self.peak_bytes = 0
+
+    def _allocate(self, shape):
+        if shape == self.shape:
+            return
+        self.shape = shape
+        self.scratch = {}  # Hilfspuffer für box_blur_axis
+        self.src = np.empty(shape, dtype=np.uint8)
+        self.dst = np.empty(shape, dtype=np.uint8)
+        self.work = np.empty(shape, dtype=np.float32)    # Ergebnis der Überblendung
+        self.effect = np.empty(shape, dtype=np.float32)  # Effektbild vor der Überblendung
+        self.temp = np.empty(shape, dtype=np.float32)    # Zwischensummen der Faltungen
+        self.gray = np.empty(shape[:2], dtype=np.float32)
+
+    def render(self, img, layers, scale=1.0, check=None, profile=False):
+        """Wendet layers an und gibt ein neues PIL-Bild zurück. check wird vor jedem Schritt
+        aufgerufen und darf eine Ausnahme werfen, um abzubrechen."""
+        tracing = profile and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        try:
+            mode = stack_mode(img, layers)
+            self._allocate((img.height, img.width, len(mode)))
+            self.src[...] = np.asarray(img.convert(mode)).reshape(self.shape)
+            self.layer_times = []
+            for filter_name, value in compile_layers(layers):
+                if check:
+                    check()
+                start = time.perf_counter()
+                self._apply(filter_name, value, scale)
+                self.src, self.dst = self.dst, self.src
+                self.layer_times.append((filter_name, time.perf_counter() - start))
+            if profile:
+                self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            return Image.fromarray(self.src[..., 0] if mode == "L" else self.src)
+        finally:
+            if tracing:
+                tracemalloc.stop()
+
+    def _store(self, values):
+        """Wie Pillow: begrenzen, abschneiden und als uint8 nach dst schreiben."""
+        np.clip(values, 0, 255, out=values)
+        np.floor(values, out=values)
+        np.copyto(self.dst, values, casting="unsafe")
+
+    def _quantize(self, values):
+        np.clip(values, 0, 255, out=values)
+        np.floor(values, out=values)
+
+    def _blend(self, first, second, alpha):
+        """Image.blend(first, second, alpha) nach dst, first/second uint8 oder float32."""
+        np.subtract(second, first, out=self.work)
+        self.work *= np.float32(alpha)
+        self.work += first
+        self._store(self.work)
+
+    def _luminance(self):
+        """Graustufen wie convert("L") in gray (exakte Ganzzahlen in float32)."""
+        src = self.src
+        if src.shape[2] == 1:
+            self.gray[...] = src[..., 0]
+            return self.gray
+        np.multiply(src[..., 0], np.float32(19595), out=self.gray)
+        self.gray += src[..., 1] * np.float32(38470)
+        self.gray += src[..., 2] * np.float32(7471)
+        self.gray += np.float32(0x8000)
+        self.gray *= np.float32(1.0 / 65536)
+        np.floor(self.gray, out=self.gray)
+        return self.gray
+
+    def _convolve(self, image_filter, out):
+        """3x3-Faltung wie ImageFilter.Kernel nach out; die Randpixel bleiben unverändert."""
+        _, divisor, offset, kernel = image_filter.filterargs
+        kernel = (np.asarray(kernel, dtype=np.float32) / np.float32(divisor)).reshape(3, 3)
+        src = self.src
+        h, w = src.shape[0] - 2, src.shape[1] - 2
+        out[...] = src
+        if h <= 0 or w <= 0:
+            return out
+        inner = out[1:-1, 1:-1]
+        temp = self.temp[1:-1, 1:-1]
+        inner.fill(offset)
+        # Kernzeile 0 wirkt in Pillow auf die Bildzeile darunter
+        for row, dy in ((0, 2), (1, 1), (2, 0)):
+            for col in range(3):
+                np.multiply(src[dy:dy + h, col:col + w], kernel[row, col], out=temp)
+                inner += temp
+        inner += np.float32(0.5)
+        self._quantize(inner)
+        return out
+
+    def _gaussian_blur(self, radius, out):
+        box = gaussian_box_radius(radius)
+        # Die sechs Durchgänge wechseln zwischen einem Hilfspuffer und dst, das erst die
+        # anschließende Überblendung wieder beschreibt
+        buffers = (scratch_buffer(self.scratch, "blur", self.shape, np.uint8), self.dst)
+        channels = self.src
+        for i, axis in enumerate((1, 1, 1, 0, 0, 0)):
+            channels = box_blur_axis(channels, box, axis, buffers[i % 2], self.scratch)
+        out[...] = channels
+        return out
+
+    def _apply(self, filter_name, value, scale):
+        src = self.src
+        if filter_name == FUSED_LUT:
+            # Punktfilter kommen über compile_layers immer als Tabelle; alle Kanäle sind gleich
+            np.take(np.asarray(value[:256], dtype=np.uint8), src, out=self.dst)
+        elif filter_name == "Kontrast":
+            mean = int(float(self._luminance().sum(dtype=np.float64)) / self.gray.size + 0.5)
+            np.subtract(src, np.float32(mean), out=self.effect)
+            self.effect *= np.float32(2.0)
+            self.effect += np.float32(mean)
+            self._quantize(self.effect)
+            self._blend(src, self.effect, value)
+        elif filter_name == "Schärfen":
+            smooth = self._convolve(ImageFilter.SMOOTH, self.effect)
+            np.subtract(src, smooth, out=self.temp)
+            self.temp *= np.float32(2.0)
+            smooth += self.temp
+            self._quantize(smooth)
+            self._blend(src, smooth, value)
+        elif filter_name == "Weichzeichnen":
+            self._blend(src, self._gaussian_blur(5 * scale, self.effect), value)
+        elif filter_name == "Graustufen":
+            self.effect[...] = self._luminance()[..., None]
+            self._blend(src, self.effect, min(max(value, 0), 1))
+        elif filter_name == "Sepia":
+            gray = self._luminance().astype(np.uint8)
+            for channel, lut in enumerate(sepia_luts()):
+                self.effect[..., channel] = lut[gray]
+            self._blend(src, self.effect, min(max(value, 0), 1))
+        elif filter_name in CONVOLUTION_FILTERS:
+            effect = self._convolve(CONVOLUTION_FILTERS[filter_name], self.effect)
+            self._blend(src, effect, min(max(value, 0), 1))
+        elif filter_name == "Binarize":
+            gray = self._luminance()
+            self.effect[...] = np.where(gray > 128, np.float32(255), np.float32(0))[..., None]
+            self._blend(src, self.effect, min(max(value, 0), 1))
+        elif filter_name == "Adaptive Threshold":
+            # Fenstermittel über Präfixsummen (box_blur_axis), wie BoxBlur in Pillow
+            radius, k = adaptive_threshold_params(value, scale)
+            gray = scratch_buffer(self.scratch, "gray", self.shape[:2], np.uint8)
+            np.copyto(gray, self._luminance(), casting="unsafe")
+            mean = scratch_buffer(self.scratch, "mean", self.shape[:2], np.uint8)
+            box_blur_axis(box_blur_axis(gray, radius, 1, mean, self.scratch), radius, 0, mean, self.scratch)
+            threshold = np.asarray(adaptive_threshold_lut(k), dtype=np.uint8)[mean]
+            self.dst[...] = np.where(gray > threshold, np.uint8(255), np.uint8(0))[..., None]
+        elif filter_name == "Color Boost":
+            self.effect[...] = self._luminance()[..., None]
+            np.subtract(src, self.effect, out=self.temp)
+            self.temp *= np.float32(2.0)
+            self.effect += self.temp
+            self._quantize(self.effect)
+            self._blend(src, self.effect, min(max(value, 0), 1))
+        else:
+            np.copyto(self.dst, src)
+
+
+def compare_engines(img, layers, scale=1.0, tolerance=2):
+    """Rechnet layers mit beiden Engines und vergleicht pixelweise. Liefert ein Dict mit
+    größter Abweichung, Anteil der Pixel über tolerance, Laufzeiten und Speicherhöchststand."""
+    start = time.perf_counter()
+    reference = apply_layers(working_image(img), layers, scale)
+    pillow_time = time.perf_counter() - start
+    engine = NumpyEngine()
+    start = time.perf_counter()
+    result = engine.render(img, layers, scale, profile=True)
+    numpy_time = time.perf_counter() - start
+    diff = np.abs(np.asarray(reference, dtype=np.int16) - np.asarray(result, dtype=np.int16))
+    return {
+        "max_diff": int(diff.max()) if diff.size else 0,
+        "outside_tolerance": float((diff > tolerance).mean()) if diff.size else 0.0,
+        "within_tolerance": bool((diff <= tolerance).all()),
+        "pillow_seconds": pillow_time,
+        "numpy_seconds": numpy_time,
+        "layer_times": engine.layer_times,
+        "peak_bytes": engine.peak_bytes,
+    }
+
+
+def render_layers(img, layers, scale=1.0, engine="Pillow", pool=None, numpy_engine=None):
+    """Filterstapel mit der gewählten Engine ("Pillow" oder "NumPy"); pool gilt nur für Pillow.
+    numpy_engine ist eine wiederverwendete NumpyEngine, damit ihre Puffer nicht bei jeder Seite
+    neu angelegt werden."""
+    if engine == "NumPy":
+        return (numpy_engine or NumpyEngine()).render(img, layers, scale)
+    return apply_layers(img, layers, scale, pool=pool)
+
+
+# ---------------------------------------------------------------------------
+# Parameter-Sweep
+# ---------------------------------------------------------------------------
+
+SWEEP_THUMB_HEIGHT = 180
+SWEEP_MAX_VARIANTS = 100
+
+
+def slots_to_layers(slots):
+    """Ebenen (Filter, Stärke) aus den Filterplätzen der GUI [(aktiv, Filter, Stärke), ...]."""
+    return [(filter_name, strength) for enabled, filter_name, strength in slots if enabled]
+
+
+def sweep_variants(slots, axes):
+    """Alle Kombinationen der Achsen [(Platz, Werte), ...]. Ein Wert ist eine Stärke (Zahl) oder
+    ein Filtername; der Platz wird dabei eingeschaltet. Liefert [(Werte, Plätze), ...]."""
+    variants = []
+    for values in itertools.product(*(values for _, values in axes)):
+        variant = list(slots)
+        for (slot, _), value in zip(axes, values):
+            _, filter_name, strength = variant[slot]
+            if isinstance(value, str):
+                variant[slot] = (True, value, strength)
+            else:
+                variant[slot] = (True, filter_name, value)
+        variants.append((values, variant))
+    return variants
+
+
+def render_sweep(img, slots, axes, scale=1.0, workers=1, cache=None):
+    """Rechnet alle Varianten aus sweep_variants parallel auf img (üblicherweise ein Vorschaubild).
+
+    Gerechnet wird stufenweise: zuerst die Präfixe bis vor die erste variierte Ebene (einmal
+    für alle), dann die bis vor die zweite (einmal je Wert der ersten Achse), zuletzt die
+    vollständigen Stapel. Über den LayerCache findet so jede Stufe ihren Präfix fertig vor und
+    rechnet nur die Ebenen ab der variierten. Liefert [(Werte, Plätze, Bild), ...]."""
+    axes = sorted(axes, key=lambda axis: axis[0])
+    variants = sweep_variants(slots, axes)
+    cache = cache or LayerCache(64 * 1024 * 1024)
+    render = lambda layers: cache.render("sweep", img, layers, scale)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for slot, _ in axes:
+            prefixes = {tuple(slots_to_layers(variant[:slot])) for _, variant in variants}
+            list(executor.map(render, prefixes))
+        images = list(executor.map(lambda item: render(slots_to_layers(item[1])), variants))
+    return [(values, variant, image) for (values, variant), image in zip(variants, images)]
+
+
 class ImageProcessorApp:
     def __init__(self, root):
         self.root = root
@@ -23,40 +1618,56 @@ class ImageProcessorApp:
 
         self.poppler_path = ""  # Benutzer kann diesen Pfad manuell setzen
         self.settings_file_name = "Keine Einstellungen geladen"
+        self.cache_mb = 256  # Speicherbudget für Zwischenergebnisse des Filterstapels
+        self.engine = "Pillow"  # Filter-Engine, "NumPy" nur wenn numpy installiert ist
+        self.tile_mb = DEFAULT_TILE_MB  # Speicherbudget beim Speichern großer Scans (gekachelt)
+        self.threads = os.cpu_count() or 1  # Threads je Bild (Streifen-Parallelisierung)
+        self.page_cache_dir = os.path.join(get_program_path(), "seitencache")  # gerasterte PDF-Seiten
+        self.page_cache_mb = 1024
+        self.pdf_grayscale = False  # PDFs direkt in Graustufen rastern (Scans, Faxe)
+        self.export_options = export_options()  # Kompression je Format beim Speichern
 
         self.load_default_settings()
+        startup_mark("Einstellungen")
         self.create_menu()
+        self.layer_cache = LayerCache(self.cache_mb * 1024 * 1024)
+        self.profiler = LayerProfiler()
+        # Render-Thread, Thread-Pool und Seiten-Cache (Ordner evtl. auf einem Netzlaufwerk)
+        # entstehen erst in start_services, wenn das Fenster schon zu sehen ist
+        self.render_worker = None
+        self.strip_pool = None
+        self.page_cache = None
+        self.shown_generation = 0  # Generation des zuletzt angezeigten Renderergebnisses
+        self.export_running = False  # es läuft gerade ein Export im Hintergrund
+        self.render_polling = False
+        self.image_key = 0  # wird bei jedem geladenen Bild erhöht, Teil des Cache-Schlüssels
 
         self.original_image = None
-        self.processed_image = None
+        self.preview_image = None  # verkleinerte Kopie von original_image für die Schieberegler
+        self.preview_scale = 1.0
+        self.zoom = 1.0  # Anzeigemaßstab bezogen auf das Original; über preview_scale wird voll gerechnet
+        self.processed_image = None  # volle Auflösung, wird erst beim Speichern oder in 1:1 berechnet
         self.filename = None
+        self.pdf_document = None  # geöffnete PDF-Datei, Seiten werden erst bei Bedarf gerastert
+        self.page_number = 1
         self.layer_vars = []
-        # 20 Filteroptionen – u.a. Mindestfilter: Negativ, Multiplikation, Helligkeit
-        self.filter_options = [
-            "Negativ",
-            "Multiplikation",
-            "Helligkeit",
-            "Kontrast",
-            "Schärfen",
-            "Weichzeichnen",
-            "Graustufen",
-            "Sepia",
-            "Posterize",
-            "Solarize",
-            "Kantenerkennung",
-            "Emboss",
-            "Edge Enhance",
-            "Detail",
-            "Smooth",
-            "Binarize",
-            "Gamma Correction",
-            "Adaptive Threshold",
-            "Color Boost",
-            "Custom"
-        ]
+        self.filter_options = list(FILTER_OPTIONS)
 
         self.create_widgets()
         self.create_layers_ui(self.slider_frame)
+        startup_mark("Fenster aufgebaut")
+        self.root.after_idle(self.start_services)
+
+    def start_services(self):
+        self.render_worker = RenderWorker(self.layer_cache)
+        self.render_worker.profiler = self.profiler
+        self.strip_pool = StripPool(self.threads)
+        self.render_worker.pool = self.strip_pool
+        try:
+            self.page_cache = PageCache(self.page_cache_dir, self.page_cache_mb * 1024 * 1024)
+        except OSError:
+            self.page_cache = None  # z.B. Programmordner schreibgeschützt – dann ohne Seiten-Cache
+        startup_mark("Dienste gestartet")
 
     def load_default_settings(self):
         prog_path = get_program_path()
@@ -66,6 +1677,14 @@ class ImageProcessorApp:
                 with open(settings_file, "r") as f:
                     settings = json.load(f)
                 self.poppler_path = settings.get("poppler_path", "")
+                self.cache_mb = settings.get("cache_mb", self.cache_mb)
+                self.engine = settings.get("engine", self.engine)
+                self.tile_mb = settings.get("tile_mb", self.tile_mb)
+                self.threads = settings.get("threads", self.threads)
+                self.page_cache_dir = settings.get("page_cache_dir", self.page_cache_dir)
+                self.page_cache_mb = settings.get("page_cache_mb", self.page_cache_mb)
+                self.pdf_grayscale = settings.get("pdf_grayscale", self.pdf_grayscale)
+                self.export_options = export_options(settings.get("export_options"))
                 self.default_layer_settings = settings.get("layers", [])
                 self.settings_file_name = os.path.basename(settings_file)
             except Exception as e:
@@ -81,6 +1700,8 @@ class ImageProcessorApp:
         file_menu = tk.Menu(menu_bar, tearoff=0)
         file_menu.add_command(label="Bild laden", command=self.load_image)
         file_menu.add_command(label="Bild speichern", command=self.save_image)
+        file_menu.add_command(label="Alle Seiten exportieren…", command=self.export_all_pages)
+        file_menu.add_command(label="Exportoptionen…", command=self.open_export_options)
         file_menu.add_separator()
         file_menu.add_command(label="Einstellungen laden", command=self.load_settings)
         file_menu.add_command(label="Einstellungen speichern", command=self.save_settings)
@@ -91,6 +1712,28 @@ class ImageProcessorApp:
         settings_menu = tk.Menu(menu_bar, tearoff=0)
         settings_menu.add_command(label="Poppler Pfad setzen", command=self.set_poppler_path)
         settings_menu.add_command(label="Poppler installieren", command=self.install_poppler)
+        self.pdf_grayscale_var = tk.BooleanVar(value=self.pdf_grayscale)
+        settings_menu.add_checkbutton(label="PDF in Graustufen rastern", variable=self.pdf_grayscale_var)
+        settings_menu.add_separator()
+        if self.engine not in ENGINES or (self.engine == "NumPy" and not NUMPY_AVAILABLE):
+            self.engine = "Pillow"
+        self.engine_var = tk.StringVar(value=self.engine)
+        engine_menu = tk.Menu(settings_menu, tearoff=0)
+        for engine in ENGINES:
+            engine_menu.add_radiobutton(label=engine, value=engine, variable=self.engine_var,
+                                        command=self.update_image,
+                                        state=tk.DISABLED if engine == "NumPy" and not NUMPY_AVAILABLE else tk.NORMAL)
+        engine_menu.add_separator()
+        engine_menu.add_command(label="Engines vergleichen", command=self.show_engine_comparison,
+                                state=tk.DISABLED if not NUMPY_AVAILABLE else tk.NORMAL)
+        settings_menu.add_cascade(label="Filter-Engine", menu=engine_menu)
+        settings_menu.add_command(label="Cache-Statistik", command=self.show_cache_stats)
+        settings_menu.add_command(label="Parameter-Sweep…", command=self.open_sweep_dialog)
+        settings_menu.add_separator()
+        self.profile_overlay_var = tk.BooleanVar(value=False)
+        settings_menu.add_checkbutton(label="Zeiten je Ebene anzeigen", variable=self.profile_overlay_var,
+                                      command=self.update_image)
+        settings_menu.add_command(label="Trace exportieren…", command=self.export_trace)
         menu_bar.add_cascade(label="Einstellungen", menu=settings_menu)
 
         self.root.config(menu=menu_bar)
@@ -143,15 +1786,7 @@ class ImageProcessorApp:
 
     def get_poppler_path(self):
         """Gibt den Poppler-Pfad zurück, abhängig davon, ob das Skript als EXE läuft oder nicht."""
-        if getattr(sys, 'frozen', False):
-            return os.path.join(sys._MEIPASS, "poppler_bin", "bin")
-        else:
-            auto_path = os.path.join(get_program_path(), "poppler_bin", "bin")
-            if os.path.exists(auto_path):
-                return auto_path
-            if os.path.exists(self.poppler_path):
-                return self.poppler_path
-            return ""
+        return find_poppler_path(self.poppler_path)
 
     def create_widgets(self):
         main_frame = tk.Frame(self.root)
@@ -161,8 +1796,25 @@ class ImageProcessorApp:
         top_frame.pack(fill=tk.X, padx=10, pady=5)
         self.filename_label = tk.Label(top_frame, text="Kein Bild geladen", anchor="w")
         self.filename_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.page_frame = tk.Frame(top_frame)
+        self.prev_page_button = tk.Button(self.page_frame, text="◀", command=lambda: self.go_to_page(self.page_number - 1))
+        self.prev_page_button.pack(side=tk.LEFT)
+        self.page_label = tk.Label(self.page_frame, text="", width=14)
+        self.page_label.pack(side=tk.LEFT)
+        self.next_page_button = tk.Button(self.page_frame, text="▶", command=lambda: self.go_to_page(self.page_number + 1))
+        self.next_page_button.pack(side=tk.LEFT)
         self.settings_label = tk.Label(top_frame, text="Einstellungen: " + self.settings_file_name, anchor="e")
         self.settings_label.pack(side=tk.RIGHT)
+        zoom_frame = tk.Frame(top_frame)
+        zoom_frame.pack(side=tk.RIGHT, padx=10)
+        tk.Button(zoom_frame, text="−", width=2, command=lambda: self.set_zoom(self.zoom / 1.25)).pack(side=tk.LEFT)
+        self.zoom_label = tk.Label(zoom_frame, text="", width=6)
+        self.zoom_label.pack(side=tk.LEFT)
+        tk.Button(zoom_frame, text="+", width=2, command=lambda: self.set_zoom(self.zoom * 1.25)).pack(side=tk.LEFT)
+        tk.Button(zoom_frame, text="Einpassen", command=self.zoom_to_fit).pack(side=tk.LEFT, padx=(5, 0))
+        tk.Button(zoom_frame, text="1:1", command=lambda: self.set_zoom(1.0)).pack(side=tk.LEFT)
+        self.render_label = tk.Label(top_frame, text="", width=22, anchor="e")
+        self.render_label.pack(side=tk.RIGHT)
 
         preview_frame = tk.Frame(main_frame)
         preview_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -181,13 +1833,32 @@ class ImageProcessorApp:
     def create_image_canvas(self, parent):
         frame = tk.Frame(parent)
         frame.pack(fill=tk.BOTH, expand=True)
-        canvas = tk.Canvas(frame, bg="white", height=480)
+        canvas = tk.Canvas(frame, bg="white", height=PREVIEW_HEIGHT)
         canvas.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
-        scrollbar_y = tk.Scrollbar(frame, orient=tk.VERTICAL, command=canvas.yview)
+        canvas.pyramid = None  # angezeigtes Bild als ImagePyramid, gezeichnet wird nur der sichtbare Teil
+        canvas.pixel_scale = 1.0
+        canvas.frame = 0
+
+        def yview(*args):
+            canvas.yview(*args)
+            self.redraw_viewport(canvas)
+
+        def xview(*args):
+            canvas.xview(*args)
+            self.redraw_viewport(canvas)
+
+        scrollbar_y = tk.Scrollbar(frame, orient=tk.VERTICAL, command=yview)
         scrollbar_y.grid(row=0, column=1, sticky="ns")
-        scrollbar_x = tk.Scrollbar(frame, orient=tk.HORIZONTAL, command=canvas.xview)
+        scrollbar_x = tk.Scrollbar(frame, orient=tk.HORIZONTAL, command=xview)
         scrollbar_x.grid(row=1, column=0, sticky="ew")
         canvas.config(yscrollcommand=scrollbar_y.set, xscrollcommand=scrollbar_x.set)
+        canvas.bind("<Configure>", lambda event: self.redraw_viewport(canvas))
+        canvas.bind("<MouseWheel>", lambda event: yview("scroll", -1 if event.delta > 0 else 1, "units"))
+        canvas.bind("<Control-MouseWheel>", lambda event: self.set_zoom(self.zoom * (1.25 if event.delta > 0 else 0.8)))
+        canvas.bind("<Button-4>", lambda event: yview("scroll", -1, "units"))
+        canvas.bind("<Button-5>", lambda event: yview("scroll", 1, "units"))
+        canvas.bind("<Control-Button-4>", lambda event: self.set_zoom(self.zoom * 1.25))
+        canvas.bind("<Control-Button-5>", lambda event: self.set_zoom(self.zoom * 0.8))
         frame.grid_rowconfigure(0, weight=1)
         frame.grid_columnconfigure(0, weight=1)
         return canvas
@@ -232,32 +1903,77 @@ class ImageProcessorApp:
 
     def load_image(self):
         file_path = filedialog.askopenfilename(
-            filetypes=[("Bilder/PDFs", "*.png *.jpg *.jpeg *.pdf"), ("Alle Dateien", "*.*")]
+            filetypes=[("Bilder/PDFs", "*.png *.jpg *.jpeg *.tif *.tiff *.pdf"), ("Alle Dateien", "*.*")]
         )
         if file_path:
             try:
+                if self.pdf_document:
+                    self.pdf_document.close()
+                    self.pdf_document = None
                 if file_path.lower().endswith(".pdf"):
                     current_poppler_path = self.get_poppler_path()
                     if not current_poppler_path:
                         messagebox.showerror("Fehler", "Poppler Pfad ist nicht gesetzt. Bitte setze den Poppler Pfad unter 'Einstellungen'.")
                         return
-                    pages = convert_from_path(file_path, dpi=200, poppler_path=current_poppler_path)
-                    self.original_image = pages[0]
+                    self.pdf_document = PdfDocument(file_path, current_poppler_path, page_cache=self.page_cache,
+                                                    grayscale=self.pdf_grayscale_var.get())
+                    self.page_number = 1
+                    image = self.pdf_document.get_page(1)
+                    self.pdf_document.prefetch(2)
+                    self.page_frame.pack(side=tk.LEFT, padx=10)
                 else:
-                    self.original_image = Image.open(file_path).convert("RGB")
+                    image = working_image(Image.open(file_path))
+                    self.page_frame.pack_forget()
                 self.filename = os.path.basename(file_path)
-                self.filename_label.config(text=self.filename)
-                self.show_image(self.original_image, self.left_canvas)
-                self.update_image()
+                self.set_original_image(image)
                 self.left_canvas.update_idletasks()
                 h = self.left_canvas.winfo_height()
                 self.right_canvas.config(height=h)
             except Exception as e:
                 messagebox.showerror("Fehler", f"Konnte Bild laden: {str(e)}")
 
+    def set_original_image(self, image):
+        self.original_image = image
+        self.preview_image, self.preview_scale = make_preview(self.original_image)
+        self.zoom = self.preview_scale
+        self.zoom_label.config(text=f"{self.zoom * 100:.0f} %")
+        self.image_key += 1
+        self.layer_cache.clear()
+        self.filename_label.config(text=self.filename)
+        if self.pdf_document:
+            self.page_label.config(text=f"Seite {self.page_number}/{self.pdf_document.page_count}")
+            self.prev_page_button.config(state=tk.NORMAL if self.page_number > 1 else tk.DISABLED)
+            self.next_page_button.config(
+                state=tk.NORMAL if self.page_number < self.pdf_document.page_count else tk.DISABLED)
+        source, scale = self.get_source_image()
+        self.show_image(source, self.left_canvas, scale=scale)
+        self.update_image()
+
+    def go_to_page(self, page):
+        if not self.pdf_document or not 1 <= page <= self.pdf_document.page_count:
+            return
+        try:
+            image = self.pdf_document.get_page(page)
+        except Exception as e:
+            messagebox.showerror("Fehler", f"Konnte Seite {page} nicht laden: {str(e)}")
+            return
+        self.page_number = page
+        self.set_original_image(image)
+        # Nachbarseiten vorladen, damit das Weiterblättern ohne Wartezeit geht
+        self.pdf_document.prefetch(page + 1)
+        self.pdf_document.prefetch(page - 1)
+
     def save_settings(self):
         settings = {
             "poppler_path": self.poppler_path,
+            "cache_mb": self.cache_mb,
+            "engine": self.engine_var.get(),
+            "tile_mb": self.tile_mb,
+            "threads": self.threads,
+            "page_cache_dir": self.page_cache_dir,
+            "page_cache_mb": self.page_cache_mb,
+            "pdf_grayscale": self.pdf_grayscale_var.get(),
+            "export_options": self.export_options,
             "layers": []
         }
         for idx, (enabled_var, filter_var, strength_var) in enumerate(self.layer_vars):
@@ -290,6 +2006,20 @@ class ImageProcessorApp:
                 with open(file_path, 'r') as f:
                     settings = json.load(f)
                 self.poppler_path = settings.get("poppler_path", "")
+                if "cache_mb" in settings:
+                    self.cache_mb = settings["cache_mb"]
+                    self.layer_cache.max_bytes = self.cache_mb * 1024 * 1024
+                if settings.get("engine") in ENGINES and not (settings["engine"] == "NumPy" and not NUMPY_AVAILABLE):
+                    self.engine_var.set(settings["engine"])
+                self.tile_mb = settings.get("tile_mb", self.tile_mb)
+                self.pdf_grayscale_var.set(settings.get("pdf_grayscale", self.pdf_grayscale_var.get()))
+                if "export_options" in settings:
+                    self.export_options = export_options(settings["export_options"])
+                if settings.get("threads", self.threads) != self.threads:
+                    self.threads = settings["threads"]
+                    self.strip_pool.shutdown()
+                    self.strip_pool = StripPool(self.threads)
+                    self.render_worker.pool = self.strip_pool
                 for setting in settings.get("layers", []):
                     layer_idx = setting["layer"] - 1
                     if layer_idx < len(self.layer_vars):
@@ -304,116 +2034,324 @@ class ImageProcessorApp:
             except Exception as e:
                 messagebox.showerror("Fehler", f"Laden fehlgeschlagen: {str(e)}")
 
-    def apply_filter(self, img, filter_name, strength=1.0):
+    def get_source_image(self):
+        """Liefert (Bild, Maßstab): die Vorschau oder, wenn weiter hineingezoomt ist als die
+        Vorschau auflöst, das Original."""
+        if self.zoom > self.preview_scale:
+            return self.original_image, 1.0
+        return self.preview_image, self.preview_scale
+
+    def get_layers(self):
+        return [(filter_var.get(), strength_var.get())
+                for enabled_var, filter_var, strength_var in self.layer_vars if enabled_var.get()]
+
+    def show_engine_comparison(self):
+        if not self.original_image:
+            messagebox.showinfo("Engines vergleichen", "Bitte zuerst ein Bild laden.")
+            return
+        source, scale = self.get_source_image()
         try:
-            if filter_name == "Negativ":
-                blend_factor = min(max(strength, 0), 1)
-                inverted = ImageOps.invert(img)
-                return Image.blend(img, inverted, blend_factor)
-            elif filter_name == "Multiplikation":
-                blend_factor = min(max(strength, 0), 1)
-                overlay_value = int(255 * blend_factor)
-                overlay = Image.new("RGB", img.size, (overlay_value, overlay_value, overlay_value))
-                return ImageChops.multiply(img, overlay)
-            elif filter_name == "Helligkeit":
-                enhancer = ImageEnhance.Brightness(img)
-                effect = enhancer.enhance(2.0)
-                return Image.blend(img, effect, strength)
-            elif filter_name == "Kontrast":
-                enhancer = ImageEnhance.Contrast(img)
-                effect = enhancer.enhance(2.0)
-                return Image.blend(img, effect, strength)
-            elif filter_name == "Schärfen":
-                enhancer = ImageEnhance.Sharpness(img)
-                effect = enhancer.enhance(2.0)
-                return Image.blend(img, effect, strength)
-            elif filter_name == "Weichzeichnen":
-                effect = img.filter(ImageFilter.GaussianBlur(radius=5))
-                return Image.blend(img, effect, strength)
-            elif filter_name == "Graustufen":
-                blend_factor = min(max(strength, 0), 1)
-                gray = img.convert("L").convert("RGB")
-                return Image.blend(img, gray, blend_factor)
-            elif filter_name == "Sepia":
-                blend_factor = min(max(strength, 0), 1)
-                gray = img.convert("L")
-                sepia = ImageOps.colorize(gray, "#704214", "#C0A080")
-                return Image.blend(img, sepia, blend_factor)
-            elif filter_name == "Posterize":
-                bits = max(1, min(8, int(round((1 - strength) * 7) + 1)))
-                return ImageOps.posterize(img, bits)
-            elif filter_name == "Solarize":
-                threshold = int((1 - strength) * 255)
-                return ImageOps.solarize(img, threshold=threshold)
-            elif filter_name == "Kantenerkennung":
-                blend_factor = min(max(strength, 0), 1)
-                effect = img.filter(ImageFilter.FIND_EDGES)
-                return Image.blend(img, effect, blend_factor)
-            elif filter_name == "Emboss":
-                blend_factor = min(max(strength, 0), 1)
-                effect = img.filter(ImageFilter.EMBOSS)
-                return Image.blend(img, effect, blend_factor)
-            elif filter_name == "Edge Enhance":
-                blend_factor = min(max(strength, 0), 1)
-                effect = img.filter(ImageFilter.EDGE_ENHANCE)
-                return Image.blend(img, effect, blend_factor)
-            elif filter_name == "Detail":
-                blend_factor = min(max(strength, 0), 1)
-                effect = img.filter(ImageFilter.DETAIL)
-                return Image.blend(img, effect, blend_factor)
-            elif filter_name == "Smooth":
-                blend_factor = min(max(strength, 0), 1)
-                effect = img.filter(ImageFilter.SMOOTH)
-                return Image.blend(img, effect, blend_factor)
-            elif filter_name == "Binarize":
-                blend_factor = min(max(strength, 0), 1)
-                gray = img.convert("L")
-                effect = gray.point(lambda x: 255 if x > 128 else 0).convert("RGB")
-                return Image.blend(img, effect, blend_factor)
-            elif filter_name == "Gamma Correction":
-                gamma = 2.0
-                inv_gamma = 1.0 / gamma
-                table = [int((i / 255.0) ** inv_gamma * 255) for i in range(256)]
-                effect = img.point(table * 3)
-                blend_factor = min(max(strength, 0), 1)
-                return Image.blend(img, effect, blend_factor)
-            elif filter_name == "Adaptive Threshold":
-                blend_factor = min(max(strength, 0), 1)
-                effect = ImageOps.autocontrast(img)
-                return Image.blend(img, effect, blend_factor)
-            elif filter_name == "Color Boost":
-                enhancer = ImageEnhance.Color(img)
-                effect = enhancer.enhance(2.0)
-                blend_factor = min(max(strength, 0), 1)
-                return Image.blend(img, effect, blend_factor)
-            elif filter_name == "Custom":
-                return img.copy()
-            else:
-                return img.copy()
+            result = compare_engines(source, self.get_layers(), scale)
         except Exception as e:
-            messagebox.showerror("Fehler", f"Fehler beim Anwenden des Filters: {str(e)}")
-            return img.copy()
+            messagebox.showerror("Fehler", f"Vergleich fehlgeschlagen: {str(e)}")
+            return
+        lines = [f"{name}: {seconds * 1000:.1f} ms" for name, seconds in result["layer_times"]]
+        messagebox.showinfo("Engines vergleichen",
+                            f"Pillow: {result['pillow_seconds'] * 1000:.1f} ms\n"
+                            f"NumPy: {result['numpy_seconds'] * 1000:.1f} ms\n"
+                            + "\n".join("  " + line for line in lines) + "\n"
+                            f"NumPy Speicherhöchststand: {result['peak_bytes'] / 1048576:.1f} MB\n"
+                            f"Größte Abweichung: {result['max_diff']} Tonwerte "
+                            f"({result['outside_tolerance'] * 100:.3f} % der Pixel über Toleranz)")
+
+    def open_sweep_dialog(self):
+        """Fragt eine oder zwei Achsen ab: Filterplatz und Stärkebereich bzw. Filterliste."""
+        if not self.original_image:
+            messagebox.showinfo("Parameter-Sweep", "Bitte zuerst ein Bild laden.")
+            return
+        top = tk.Toplevel(self.root)
+        top.title("Parameter-Sweep")
+        slot_names = ["–"] + [f"Filter {i + 1}" for i in range(len(self.layer_vars))]
+        rows = []
+        for row, label in enumerate(("Achse 1", "Achse 2")):
+            tk.Label(top, text=label, font=("Arial", 10, "bold")).grid(row=row * 2, column=0, padx=5, pady=(8, 2), sticky="w")
+            slot_var = tk.StringVar(value=slot_names[1] if row == 0 else slot_names[0])
+            ttk.Combobox(top, textvariable=slot_var, values=slot_names, state="readonly", width=10).grid(
+                row=row * 2, column=1, padx=5, pady=(8, 2))
+            kind_var = tk.StringVar(value="Stärke")
+            ttk.Combobox(top, textvariable=kind_var, values=["Stärke", "Filter"], state="readonly", width=8).grid(
+                row=row * 2, column=2, padx=5, pady=(8, 2))
+            range_var = tk.StringVar(value="0.0 1.0 5")
+            tk.Label(top, text="Von Bis Anzahl:").grid(row=row * 2 + 1, column=0, padx=5, sticky="w")
+            tk.Entry(top, textvariable=range_var, width=14).grid(row=row * 2 + 1, column=1, padx=5)
+            filter_list = tk.Listbox(top, selectmode=tk.MULTIPLE, height=4, exportselection=False)
+            for name in self.filter_options:
+                filter_list.insert(tk.END, name)
+            filter_list.grid(row=row * 2 + 1, column=2, columnspan=2, padx=5, pady=2)
+            rows.append((slot_var, kind_var, range_var, filter_list))
+
+        def start():
+            try:
+                axes = self.parse_sweep_axes(rows, slot_names)
+            except ValueError as e:
+                messagebox.showerror("Parameter-Sweep", str(e), parent=top)
+                return
+            top.destroy()
+            self.start_sweep(axes)
+
+        tk.Button(top, text="Berechnen", command=start).grid(row=4, column=0, columnspan=4, pady=10)
+
+    def parse_sweep_axes(self, rows, slot_names):
+        axes = []
+        for slot_var, kind_var, range_var, filter_list in rows:
+            if slot_var.get() == slot_names[0]:
+                continue
+            slot = slot_names.index(slot_var.get()) - 1
+            if any(slot == other for other, _ in axes):
+                raise ValueError("Beide Achsen verwenden denselben Filterplatz.")
+            if kind_var.get() == "Filter":
+                values = [filter_list.get(index) for index in filter_list.curselection()]
+                if not values:
+                    raise ValueError(f"Für {slot_var.get()} sind keine Filter ausgewählt.")
+            else:
+                try:
+                    low, high, count = range_var.get().replace(",", ".").split()
+                    low, high, count = float(low), float(high), int(count)
+                except ValueError:
+                    raise ValueError("Stärke bitte als 'Von Bis Anzahl' angeben, z.B. 0.2 0.8 4.")
+                count = max(1, count)
+                step = (high - low) / (count - 1) if count > 1 else 0.0
+                values = [round(low + i * step, 2) for i in range(count)]
+            axes.append((slot, values))
+        if not axes:
+            raise ValueError("Bitte mindestens eine Achse wählen.")
+        total = 1
+        for _, values in axes:
+            total *= len(values)
+        if total > SWEEP_MAX_VARIANTS:
+            raise ValueError(f"{total} Varianten sind zu viele (höchstens {SWEEP_MAX_VARIANTS}).")
+        return axes
+
+    def start_sweep(self, axes):
+        """Rechnet den Sweep im Hintergrund, damit das Fenster bedienbar bleibt."""
+        thumb, scale = make_preview(self.original_image, SWEEP_THUMB_HEIGHT)
+        slots = [(enabled_var.get(), filter_var.get(), strength_var.get())
+                 for enabled_var, filter_var, strength_var in self.layer_vars]
+        results = queue.Queue()
+
+        def run():
+            start = time.perf_counter()
+            try:
+                results.put((render_sweep(thumb, slots, axes, scale, self.threads), None,
+                             time.perf_counter() - start))
+            except Exception as e:
+                results.put((None, str(e), 0.0))
+
+        self.render_label.config(text="Sweep …")
+        threading.Thread(target=run, daemon=True).start()
+
+        def poll():
+            try:
+                tiles, error, elapsed = results.get_nowait()
+            except queue.Empty:
+                self.root.after(RENDER_POLL_MS * 4, poll)
+                return
+            self.render_label.config(text="")
+            if error:
+                messagebox.showerror("Fehler", f"Sweep fehlgeschlagen: {error}")
+            else:
+                self.show_sweep(axes, tiles, elapsed)
+
+        self.root.after(RENDER_POLL_MS * 4, poll)
+
+    def show_sweep(self, axes, tiles, elapsed):
+        """Kontaktabzug: Zeilen sind die Werte der ersten Achse, Spalten die der zweiten.
+        Ein Klick auf eine Kachel übernimmt deren Einstellung in die Filterplätze."""
+        axes = sorted(axes, key=lambda axis: axis[0])
+        columns = len(axes[1][1]) if len(axes) > 1 else min(len(tiles), 6)
+        top = tk.Toplevel(self.root)
+        top.title(f"Parameter-Sweep – {len(tiles)} Varianten in {elapsed:.1f} s (Klick übernimmt)")
+        canvas = tk.Canvas(top, bg="gray")
+        scrollbar = tk.Scrollbar(top, orient=tk.VERTICAL, command=canvas.yview)
+        canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        canvas.photos = []
+        tile_width = max(image.width for _, _, image in tiles) + 10
+        tile_height = SWEEP_THUMB_HEIGHT + 30
+        for index, (values, variant, image) in enumerate(tiles):
+            x = 5 + (index % columns) * tile_width
+            y = 5 + (index // columns) * tile_height
+            from PIL import ImageTk
+            photo = ImageTk.PhotoImage(image)
+            canvas.photos.append(photo)
+            tag = f"tile{index}"
+            canvas.create_image(x, y, image=photo, anchor="nw", tags=tag)
+            caption = " / ".join(f"{slot + 1}: {value:.2f}" if not isinstance(value, str) else f"{slot + 1}: {value}"
+                                 for (slot, _), value in zip(axes, values))
+            canvas.create_text(x, y + image.height + 4, text=caption, anchor="nw", tags=tag)
+            canvas.tag_bind(tag, "<Button-1>", lambda event, variant=variant: self.apply_sweep_variant(variant))
+        rows = -(-len(tiles) // columns)
+        canvas.config(scrollregion=(0, 0, columns * tile_width + 10, rows * tile_height + 10),
+                      width=min(columns * tile_width + 10, 1400), height=min(rows * tile_height + 10, 800))
+
+    def apply_sweep_variant(self, variant):
+        for (enabled_var, filter_var, strength_var), (enabled, filter_name, strength) in zip(self.layer_vars, variant):
+            enabled_var.set(enabled)
+            filter_var.set(filter_name)
+            strength_var.set(strength)
+        self.update_image()
+
+    def show_cache_stats(self):
+        stats = self.layer_cache.stats()
+        total = stats["hits"] + stats["misses"]
+        rate = 100.0 * stats["hits"] / total if total else 0.0
+        messagebox.showinfo("Cache-Statistik",
+                            f"Treffer: {stats['hits']}\nNeu berechnet: {stats['misses']} ({rate:.0f} % Treffer)\n"
+                            f"Einträge: {stats['entries']}\n"
+                            f"Belegt: {stats['bytes'] / 1048576:.1f} von {stats['max_bytes'] / 1048576:.0f} MB"
+                            + self.page_cache_summary())
+
+    def page_cache_summary(self):
+        if not self.page_cache:
+            return "\n\nSeiten-Cache: nicht verfügbar"
+        stats = self.page_cache.stats()
+        return (f"\n\nSeiten-Cache (PDF): {stats['hits']} Treffer, {stats['misses']} gerastert\n"
+                f"{stats['pages']} Seiten, {stats['bytes'] / 1048576:.1f} von {stats['max_bytes'] / 1048576:.0f} MB")
 
     def update_image(self, *args):
         if self.original_image:
-            img = self.original_image.copy()
-            for enabled_var, filter_var, strength_var in self.layer_vars:
-                if enabled_var.get():
-                    img = self.apply_filter(img, filter_var.get(), strength_var.get())
-            self.processed_image = img
-            self.show_image(img, self.right_canvas)
-
-    def show_image(self, image, canvas):
+            source, scale = self.get_source_image()
+            self.processed_image = None
+            self.render_worker.submit(self.image_key, source, self.get_layers(), scale, self.engine_var.get())
+            self.render_label.config(text="Rendern …")
+            if not self.render_polling:
+                self.render_polling = True
+                self.root.after(RENDER_POLL_MS, self.poll_render_results)
+
+    def poll_render_results(self):
+        """Holt fertige Ergebnisse des Render-Threads ab; nur das neueste wird angezeigt."""
+        latest = None
+        try:
+            while True:
+                latest = self.render_worker.results.get_nowait()
+        except queue.Empty:
+            pass
+        if latest and latest[0] == self.render_worker.generation:
+            generation, img, scale, error, elapsed = latest
+            self.shown_generation = generation
+            if error:
+                self.render_label.config(text="")
+                messagebox.showerror("Fehler", f"Fehler beim Anwenden des Filters: {error}")
+            else:
+                # Nur ein Ergebnis in voller Auflösung kann direkt gespeichert werden
+                self.processed_image = img if scale == 1.0 else None
+                self.show_image(img, self.right_canvas, generation, scale)
+                self.render_label.config(text=f"Vorschau: {elapsed * 1000:.0f} ms")
+                if self.profile_overlay_var.get():
+                    self.draw_profile_overlay(generation)
+        if self.shown_generation < self.render_worker.generation:
+            self.root.after(RENDER_POLL_MS, self.poll_render_results)
+        else:
+            self.render_polling = False
+
+    def set_zoom(self, zoom):
+        if not self.original_image:
+            return
+        zoom = min(max(zoom, MIN_ZOOM), MAX_ZOOM)
+        was_full_resolution = self.zoom > self.preview_scale
+        self.zoom = zoom
+        self.zoom_label.config(text=f"{zoom * 100:.0f} %")
+        if (zoom > self.preview_scale) != was_full_resolution:
+            # Wechsel zwischen Vorschau und Original: neu rechnen, bis dahin das alte Bild skalieren
+            source, scale = self.get_source_image()
+            self.show_image(source, self.left_canvas, scale=scale)
+            self.update_image()
+        self.redraw_viewport(self.left_canvas)
+        self.redraw_viewport(self.right_canvas)
+
+    def zoom_to_fit(self):
+        if self.original_image:
+            width = max(1, self.left_canvas.winfo_width() - 20)
+            height = max(1, self.left_canvas.winfo_height() - 20)
+            self.set_zoom(min(width / self.original_image.width, height / self.original_image.height))
+
+    def draw_profile_overlay(self, generation):
+        """Blendet die Zeiten der Schritte des angezeigten Rendervorgangs über der Vorschau ein."""
+        lines = []
+        for event in self.profiler.frame_events(generation):
+            args = event["args"]
+            line = f"{event['name']}: {event['dur'] / 1000:.1f} ms"
+            if "allocated_bytes" in args:
+                line += f", {args['allocated_bytes'] / 1048576:.1f} MB"
+            if "output" in args:
+                line += f", {args['output']}"
+            lines.append(line)
+        if not lines:
+            lines.append("Alle Ebenen aus dem Cache")
+        text = self.right_canvas.create_text(16, 16, text="\n".join(lines), anchor="nw",
+                                             font=("Courier", 9), fill="yellow")
+        self.right_canvas.create_rectangle(self.right_canvas.bbox(text), fill="black", outline="")
+        self.right_canvas.tag_raise(text)
+
+    def export_trace(self):
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("Chrome Trace", "*.json"), ("Alle Dateien", "*.*")],
+            title="Trace exportieren",
+            initialfile="bildprozessor_trace.json"
+        )
+        if file_path:
+            try:
+                self.profiler.export_chrome_trace(file_path)
+                messagebox.showinfo("Erfolg", "Trace gespeichert. Öffnen mit chrome://tracing oder ui.perfetto.dev.")
+            except Exception as e:
+                messagebox.showerror("Fehler", f"Speichern fehlgeschlagen: {str(e)}")
+
+    def show_image(self, image, canvas, frame=0, scale=1.0):
+        """Zeigt image (mit Maßstab scale zum Original) im aktuellen Zoom an."""
         canvas.delete("all")
-        photo = ImageTk.PhotoImage(image)
-        canvas.create_image(10, 10, image=photo, anchor="nw")
-        canvas.image = photo
-        width, height = image.size
+        canvas.pyramid = ImagePyramid(image)
+        canvas.pixel_scale = scale
+        canvas.frame = frame
+        self.redraw_viewport(canvas)
+
+    def redraw_viewport(self, canvas):
+        """Wandelt nur den sichtbaren Ausschnitt in ein Tk-Bild um und legt ihn an seine Stelle."""
+        if canvas.pyramid is None:
+            return
+        factor = self.zoom / canvas.pixel_scale
+        width = round(canvas.pyramid.width * factor)
+        height = round(canvas.pyramid.height * factor)
         canvas.config(scrollregion=(0, 0, width + 20, height + 20))
+        view_x = int(canvas.canvasx(0)) - 10
+        view_y = int(canvas.canvasy(0)) - 10
+        left, top = max(0, view_x), max(0, view_y)
+        right = min(width, view_x + max(canvas.winfo_width(), canvas.winfo_reqwidth()))
+        bottom = min(height, view_y + max(canvas.winfo_height(), canvas.winfo_reqheight()))
+        canvas.delete("viewport")
+        if right <= left or bottom <= top:
+            return
+        view = canvas.pyramid.region(factor, (left, top, right, bottom))
+        # Die Umwandlung in ein Tk-Bild kostet oft mehr als die Filter selbst
+        with self.profiler.measure("show_image (PhotoImage)", frame=canvas.frame, img_in=view):
+            from PIL import ImageTk
+            photo = ImageTk.PhotoImage(view)
+        canvas.create_image(10 + left, 10 + top, image=photo, anchor="nw", tags="viewport")
+        canvas.tag_lower("viewport")
+        canvas.image = photo
 
     def save_settings(self):
         settings = {
             "poppler_path": self.poppler_path,
+            "cache_mb": self.cache_mb,
+            "engine": self.engine_var.get(),
+            "tile_mb": self.tile_mb,
+            "threads": self.threads,
+            "page_cache_dir": self.page_cache_dir,
+            "page_cache_mb": self.page_cache_mb,
+            "pdf_grayscale": self.pdf_grayscale_var.get(),
+            "export_options": self.export_options,
             "layers": []
         }
         for idx, (enabled_var, filter_var, strength_var) in enumerate(self.layer_vars):
@@ -446,6 +2384,20 @@ class ImageProcessorApp:
                 with open(file_path, 'r') as f:
                     settings = json.load(f)
                 self.poppler_path = settings.get("poppler_path", "")
+                if "cache_mb" in settings:
+                    self.cache_mb = settings["cache_mb"]
+                    self.layer_cache.max_bytes = self.cache_mb * 1024 * 1024
+                if settings.get("engine") in ENGINES and not (settings["engine"] == "NumPy" and not NUMPY_AVAILABLE):
+                    self.engine_var.set(settings["engine"])
+                self.tile_mb = settings.get("tile_mb", self.tile_mb)
+                self.pdf_grayscale_var.set(settings.get("pdf_grayscale", self.pdf_grayscale_var.get()))
+                if "export_options" in settings:
+                    self.export_options = export_options(settings["export_options"])
+                if settings.get("threads", self.threads) != self.threads:
+                    self.threads = settings["threads"]
+                    self.strip_pool.shutdown()
+                    self.strip_pool = StripPool(self.threads)
+                    self.render_worker.pool = self.strip_pool
                 for setting in settings.get("layers", []):
                     layer_idx = setting["layer"] - 1
                     if layer_idx < len(self.layer_vars):
@@ -460,30 +2412,1004 @@ class ImageProcessorApp:
             except Exception as e:
                 messagebox.showerror("Fehler", f"Laden fehlgeschlagen: {str(e)}")
 
+    def default_export_name(self, all_pages=False):
+        filter_info = []
+        for i, (enabled_var, filter_var, strength_var) in enumerate(self.layer_vars):
+            if enabled_var.get():
+                filter_info.append(f"{i+1}_{filter_var.get()}_{strength_var.get():.2f}")
+        if not self.filename:
+            return ""
+        base = os.path.splitext(self.filename)[0]
+        if self.pdf_document and not all_pages:
+            base = f"{base}_Seite{self.page_number:03d}"
+        return f"{base}_" + "_".join(filter_info) if filter_info else base
+
     def save_image(self):
-        if self.processed_image:
-            filter_info = []
-            for i, (enabled_var, filter_var, strength_var) in enumerate(self.layer_vars):
-                if enabled_var.get():
-                    filter_info.append(f"{i+1}_{filter_var.get()}_{strength_var.get():.2f}")
-            default_name = ""
-            if self.filename:
-                base = os.path.splitext(self.filename)[0]
-                default_name = f"{base}_" + "_".join(filter_info) if filter_info else base
+        if self.original_image:
             file_path = filedialog.asksaveasfilename(
                 defaultextension=".png",
-                filetypes=[("PNG", "*.png"), ("JPEG", "*.jpg"), ("Alle Dateien", "*.*")],
+                filetypes=[("PNG", "*.png"), ("TIFF", "*.tif"), ("JPEG", "*.jpg"), ("PDF", "*.pdf"),
+                           ("Alle Dateien", "*.*")],
                 title="Bild speichern",
-                initialfile=default_name
+                initialfile=self.default_export_name()
             )
             if file_path:
+                dpi = self.pdf_document.dpi if self.pdf_document else None
+                if self.processed_image is not None:
+                    self.start_export(file_path, [self.processed_image], 1, lambda img: img, dpi)
+                else:
+                    self.start_export(file_path, [self.original_image], 1, self.export_processor(), dpi,
+                                      keep_result=True)
+
+    def export_all_pages(self):
+        """Rechnet alle Seiten der geöffneten PDF und schreibt sie nacheinander in eine
+        mehrseitige PDF- oder TIFF-Datei."""
+        if not self.pdf_document:
+            self.save_image()
+            return
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".pdf",
+            filetypes=[("PDF", "*.pdf"), ("TIFF", "*.tif")],
+            title="Alle Seiten exportieren",
+            initialfile=self.default_export_name(all_pages=True)
+        )
+        if file_path:
+            self.start_export(file_path, self.pdf_document.iter_pages(), self.pdf_document.page_count,
+                              self.export_processor(), self.pdf_document.dpi)
+
+    def export_processor(self):
+        """Filterfunktion für den Export-Thread: große Scans gekachelt, sonst mit dem Thread-Pool."""
+        layers = self.get_layers()
+        engine = self.engine_var.get()
+        budget = self.tile_mb * 1024 * 1024
+        pool = self.strip_pool
+        numpy_engine = NumpyEngine() if engine == "NumPy" else None
+
+        def process(img):
+            if needs_tiling(img, budget):
+                # Große Scans streifenweise rechnen statt alle Zwischenbilder voll zu halten
+                return process_tiled(img, layers, budget)
+            return render_layers(img, layers, engine=engine, pool=pool, numpy_engine=numpy_engine)
+        return process
+
+    def start_export(self, file_path, pages, page_count, process, dpi=None, keep_result=False):
+        """Speichert im Hintergrund, damit das Fenster bedienbar bleibt. Die Seiten werden
+        einzeln gerechnet und sofort geschrieben (export_document); am Ende wird der Durchsatz
+        angezeigt. Mit keep_result wird das Ergebnis einer Einzelseite als processed_image
+        übernommen, solange Bild und Filter inzwischen nicht geändert wurden."""
+        if self.export_running:
+            messagebox.showinfo("Export", "Es läuft bereits ein Export.")
+            return
+        source, layers = self.original_image, self.get_layers()
+        options = dict(self.export_options)
+        messages = queue.Queue()
+        results = []
+
+        def keep(img):
+            img = process(img)
+            if keep_result:
+                results.append(img)
+            return img
+
+        def run():
+            try:
+                messages.put(("done", export_document(pages, page_count, file_path, keep, options, dpi,
+                                                      lambda done: messages.put(("progress", done)))))
+            except Exception as e:
+                messages.put(("error", str(e)))
+
+        self.export_running = True
+        self.render_label.config(text="Speichern …")
+        threading.Thread(target=run, daemon=True).start()
+
+        def poll():
+            while True:
+                try:
+                    kind, value = messages.get_nowait()
+                except queue.Empty:
+                    self.root.after(RENDER_POLL_MS * 4, poll)
+                    return
+                if kind != "progress":
+                    break
+                self.render_label.config(text=f"Speichern {value}/{page_count} …")
+            self.export_running = False
+            self.render_label.config(text="")
+            if kind == "error":
+                messagebox.showerror("Fehler", f"Speichern fehlgeschlagen: {value}")
+                return
+            if results and self.original_image is source and self.get_layers() == layers:
+                self.processed_image = results[0]
+            count, size, megapixels, elapsed = value
+            elapsed = max(elapsed, 1e-6)
+            messagebox.showinfo("Erfolg", f"{count} Seite(n) gespeichert: {size / 1048576:.1f} MB in {elapsed:.1f} s "
+                                          f"({size / 1048576 / elapsed:.1f} MB/s, {megapixels / elapsed:.1f} MP/s, "
+                                          f"{count / elapsed:.1f} Seiten/s)")
+
+        self.root.after(RENDER_POLL_MS * 4, poll)
+
+    def open_export_options(self):
+        """Kompression je Format: schneller speichern gegen kleinere Dateien."""
+        top = tk.Toplevel(self.root)
+        top.title("Exportoptionen")
+        png_var = tk.IntVar(value=self.export_options["png_level"])
+        jpeg_var = tk.IntVar(value=self.export_options["jpeg_quality"])
+        tiff_var = tk.StringVar(value=self.export_options["tiff_codec"])
+        tk.Label(top, text="PNG-Stufe (0 schnell – 9 klein):").grid(row=0, column=0, padx=5, pady=4, sticky="w")
+        tk.Scale(top, from_=0, to=9, orient=tk.HORIZONTAL, variable=png_var).grid(row=0, column=1, padx=5)
+        tk.Label(top, text="JPEG-Qualität (auch PDF):").grid(row=1, column=0, padx=5, pady=4, sticky="w")
+        tk.Scale(top, from_=1, to=95, orient=tk.HORIZONTAL, variable=jpeg_var).grid(row=1, column=1, padx=5)
+        tk.Label(top, text="TIFF-Kompression:").grid(row=2, column=0, padx=5, pady=4, sticky="w")
+        ttk.Combobox(top, textvariable=tiff_var, values=TIFF_CODECS, state="readonly", width=18).grid(
+            row=2, column=1, padx=5)
+        tk.Label(top, text="Reines Schwarz/Weiß wird immer als 1-Bit (Group 4) gespeichert.").grid(
+            row=3, column=0, columnspan=2, padx=5, pady=4)
+
+        def apply():
+            self.export_options = export_options({"png_level": png_var.get(), "jpeg_quality": jpeg_var.get(),
+                                                  "tiff_codec": tiff_var.get()})
+            top.destroy()
+
+        tk.Button(top, text="Übernehmen", command=apply).grid(row=4, column=0, columnspan=2, pady=10)
+
+
+# ---------------------------------------------------------------------------
+# Batch-Betrieb ohne GUI
+# ---------------------------------------------------------------------------
+
+BATCH_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".pdf")
+BATCH_FORMATS = ("png", "tif", "jpg", "pdf")
+
+# Wird pro Worker-Prozess einmal durch _init_batch_worker gesetzt
+_batch_config = {}
+
+
+def load_settings_file(file_path):
+    """Liest eine settings.json und gibt (Poppler-Pfad, Ebenen) zurück. Eine reine Liste von
+    Ebenen wie in Einstellung.json wird ebenfalls angenommen."""
+    with open(file_path, "r") as f:
+        settings = json.load(f)
+    if isinstance(settings, list):
+        return "", settings
+    return settings.get("poppler_path", ""), settings.get("layers", [])
+
+
+def collect_batch_jobs(input_dir, poppler_path, page_cache=None):
+    """Zerlegt den Eingabeordner in Aufträge (Datei, Seite). Bilder haben Seite None,
+    PDFs werden seitenweise verteilt."""
+    jobs = []
+    errors = []
+    for name in sorted(os.listdir(input_dir)):
+        file_path = os.path.join(input_dir, name)
+        if not os.path.isfile(file_path) or not name.lower().endswith(BATCH_EXTENSIONS):
+            continue
+        try:
+            jobs.extend(file_jobs(file_path, poppler_path, page_cache))
+        except Exception as e:
+            errors.append((file_path, None, str(e)))
+    return jobs, errors
+
+
+def file_jobs(file_path, poppler_path, page_cache=None):
+    """Aufträge (Datei, Seite) für eine einzelne Datei."""
+    if file_path.lower().endswith(".pdf"):
+        page_count = pdf_page_count(file_path, poppler_path, page_cache)
+        return [(file_path, page) for page in range(1, page_count + 1)]
+    return [(file_path, None)]
+
+
+def batch_output_path(output_dir, file_path, page, output_format="png"):
+    """Ausgabedatei für eine Datei bzw. PDF-Seite. Die Endung der Quelle bleibt im Namen
+    (scan.tif -> scan_tif.png), sonst überschrieben sich scan.tif und scan.jpg gegenseitig."""
+    base, extension = os.path.splitext(os.path.basename(file_path))
+    if extension:
+        base = f"{base}_{extension[1:].lower()}"
+    if page is not None:
+        base = f"{base}_Seite{page:03d}"
+    return os.path.join(output_dir, f"{base}.{output_format}")
+
+
+def _init_batch_worker(layers, output_dir, poppler_path, dpi, engine, tile_budget, threads, page_cache_dir,
+                       page_cache_mb, grayscale, output_format, export_options=None):
+    # Strg+C behandelt nur der Hauptprozess, er beendet den Pool dann selbst
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Der Seiten-Cache wird hier gebaut statt übergeben: Sein Lock lässt sich unter "spawn"
+    # (Windows, macOS) nicht pickeln. Gemeinsam ist nur der Ordner auf der Platte.
+    page_cache = PageCache(page_cache_dir, page_cache_mb * 1024 * 1024) if page_cache_dir else None
+    _batch_config.update(layers=layers, output_dir=output_dir, poppler_path=poppler_path, dpi=dpi,
+                         engine=engine, tile_budget=tile_budget,
+                         numpy_engine=NumpyEngine() if engine == "NumPy" else None,
+                         pool=StripPool(threads) if threads > 1 else None, page_cache=page_cache,
+                         grayscale=grayscale, output_format=output_format, export_options=export_options)
+
+
+def _process_batch_job(job):
+    """Verarbeitet eine Datei bzw. PDF-Seite und schreibt das Ergebnis sofort auf die Platte.
+    Fehler werden zurückgegeben statt geworfen, damit andere Dateien weiterlaufen."""
+    file_path, page = job
+    try:
+        if page is not None:
+            img = rasterize_pdf_page(file_path, page, _batch_config["dpi"], _batch_config["poppler_path"],
+                                     _batch_config["page_cache"], _batch_config["grayscale"])
+        else:
+            img = working_image(Image.open(file_path))
+        tile_budget = _batch_config["tile_budget"]
+        if tile_budget and needs_tiling(img, tile_budget):
+            img = process_tiled(img, _batch_config["layers"], tile_budget)
+        else:
+            img = render_layers(img, _batch_config["layers"], engine=_batch_config["engine"],
+                                pool=_batch_config["pool"], numpy_engine=_batch_config["numpy_engine"])
+        save_output(img, batch_output_path(_batch_config["output_dir"], file_path, page,
+                                           _batch_config["output_format"]),
+                    options=_batch_config["export_options"],
+                    dpi=_batch_config["dpi"] if page is not None else None)
+        return file_path, page, None
+    except Exception as e:
+        return file_path, page, str(e)
+
+
+def run_batch(input_dir, output_dir, settings_path, workers=None, dpi=200, engine="Pillow", tile_mb=0,
+              threads=1, page_cache_dir=None, page_cache_mb=1024, grayscale=False, output_format="png",
+              export_options=None):
+    """Wendet den Filterstapel aus settings_path auf alle Bilder/PDFs in input_dir an.
+    Mit tile_mb > 0 werden Seiten, deren Zwischenbilder das Budget sprengen würden, gekachelt
+    verarbeitet, mit threads > 1 wird jede Seite zusätzlich in Streifen parallel gerechnet.
+    Mit page_cache_dir werden gerasterte PDF-Seiten dort zwischengespeichert, sodass ein
+    erneuter Lauf über dieselben PDFs Poppler nicht mehr braucht. grayscale rastert PDFs in
+    Graustufen; reine Schwarz/Weiß-Ergebnisse werden als 1-Bit geschrieben, bei output_format
+    "tif" mit CCITT Group 4. export_options wählt die übrige Kompression (DEFAULT_EXPORT_OPTIONS).
+    Gibt 0 zurück, wenn alles geklappt hat, sonst 1."""
+    poppler_path, layer_settings = load_settings_file(settings_path)
+    poppler_path = find_poppler_path(poppler_path)
+    layers = active_layers(layer_settings)
+    os.makedirs(output_dir, exist_ok=True)
+    page_cache = PageCache(page_cache_dir, page_cache_mb * 1024 * 1024) if page_cache_dir else None
+
+    start = time.perf_counter()
+    jobs, errors = collect_batch_jobs(input_dir, poppler_path, page_cache)
+    for file_path, page, error in errors:
+        print(f"FEHLER {os.path.basename(file_path)}: {error}", file=sys.stderr)
+    done = 0
+    if jobs:
+        workers = workers or os.cpu_count() or 1
+        with multiprocessing.Pool(min(workers, len(jobs)), initializer=_init_batch_worker,
+                                  initargs=(layers, output_dir, poppler_path, dpi, engine,
+                                            tile_mb * 1024 * 1024, threads, page_cache_dir, page_cache_mb,
+                                            grayscale, output_format, export_options)) as pool:
+            for file_path, page, error in pool.imap_unordered(_process_batch_job, jobs):
+                label = os.path.basename(file_path) + (f" Seite {page}" if page is not None else "")
+                if error:
+                    errors.append((file_path, page, error))
+                    print(f"FEHLER {label}: {error}", file=sys.stderr)
+                else:
+                    done += 1
+                    print(f"OK     {label}")
+    elapsed = time.perf_counter() - start
+
+    rate = done / elapsed if elapsed > 0 else 0.0
+    print(f"{done} Seiten in {elapsed:.1f} s verarbeitet ({rate:.2f} Seiten/s), {len(errors)} Fehler")
+    return 1 if errors else 0
+
+
+# ---------------------------------------------------------------------------
+# Überwachter Eingangsordner
+# ---------------------------------------------------------------------------
+
+def percentile(values, q):
+    """q-Quantil (0..100) mit linearer Interpolation, None bei leerer Liste."""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class JobJournal:
+    """Persistentes Auftragsjournal in SQLite.
+
+    jobs ist nach dem SHA-256 des Dateiinhalts geschlüsselt: Was einmal fertig ist, wird nach
+    einem Neustart nicht noch einmal gerechnet, und ein zweiter Scan mit gleichem Inhalt gilt
+    als Duplikat. files merkt sich Pfad, Größe und Änderungszeit, damit bekannte Dateien beim
+    Durchsuchen des Ordners nicht jedes Mal neu gehasht werden müssen.
+    """
+
+    def __init__(self, path):
+        import sqlite3
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                digest TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                pages INTEGER,
+                queued_at REAL NOT NULL,
+                finished_at REAL,
+                error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL
+            );
+        """)
+        self.db.commit()
+
+    def known_file(self, path, size, mtime_ns):
+        row = self.db.execute("SELECT 1 FROM files WHERE path = ? AND size = ? AND mtime_ns = ?",
+                              (path, size, mtime_ns)).fetchone()
+        return row is not None
+
+    def remember_file(self, path, size, mtime_ns, digest):
+        self.db.execute("INSERT OR REPLACE INTO files (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)",
+                        (path, size, mtime_ns, digest))
+        self.db.commit()
+
+    def job(self, digest):
+        """(Pfad, Status) des Auftrags oder None."""
+        return self.db.execute("SELECT path, status FROM jobs WHERE digest = ?", (digest,)).fetchone()
+
+    def add(self, digest, path, queued_at):
+        self.db.execute("INSERT INTO jobs (digest, path, status, queued_at) VALUES (?, ?, 'queued', ?)",
+                        (digest, path, queued_at))
+        self.db.commit()
+
+    def start(self, digest, pages):
+        self.db.execute("UPDATE jobs SET status = 'running', pages = ? WHERE digest = ?", (pages, digest))
+        self.db.commit()
+
+    def finish(self, digest, finished_at, error=None):
+        self.db.execute("UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE digest = ?",
+                        ("failed" if error else "done", finished_at, error, digest))
+        self.db.commit()
+
+    def unfinished(self):
+        """Aufträge, die beim letzten Beenden noch offen waren: [(digest, Pfad, queued_at)]."""
+        return self.db.execute("SELECT digest, path, queued_at FROM jobs WHERE status IN ('queued', 'running') "
+                               "ORDER BY queued_at").fetchall()
+
+    def counts(self):
+        return dict(self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def close(self):
+        self.db.close()
+
+
+class WatchFolder:
+    """Verarbeitet neue Dateien aus input_dir mit den Batch-Workern aus pool.
+
+    Eine Datei wird erst übernommen, wenn Größe und Änderungszeit über zwei Durchläufe gleich
+    geblieben sind – Scanner schreiben über das Netz oft mehrere Sekunden an einer Datei.
+    Die Seiten laufen asynchron; fertige Ergebnisse sammelt results, das Journal wird nur aus
+    dem Hauptthread geschrieben (SQLite-Verbindungen sind an ihren Thread gebunden).
+    """
+
+    def __init__(self, input_dir, output_dir, journal, pool, poppler_path, page_cache=None):
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.journal = journal
+        self.pool = pool
+        self.poppler_path = poppler_path
+        self.page_cache = page_cache
+        self.candidates = {}  # Pfad -> (Größe, Änderungszeit) aus dem letzten Durchlauf
+        self.active = {}  # digest -> offene Seiten, Fehler, Zeitpunkt der Aufnahme
+        self.results = queue.Queue()
+        self.started = time.time()
+        self.latencies = deque(maxlen=500)  # Sekunden von Aufnahme bis Ergebnis je Datei
+        self.finished_pages = deque()  # Zeitpunkte fertiger Seiten der letzten Minute
+        self.pages_done = 0
+        self.duplicates = 0
+
+    def resume(self):
+        for digest, path, queued_at in self.journal.unfinished():
+            print(f"WIEDER {os.path.basename(path)}")
+            self.submit(digest, path, queued_at)
+
+    def scan(self):
+        try:
+            names = sorted(os.listdir(self.input_dir))
+        except OSError as e:
+            print(f"FEHLER Eingangsordner: {e}", file=sys.stderr)
+            return
+        candidates = {}
+        for name in names:
+            file_path = os.path.join(self.input_dir, name)
+            if not name.lower().endswith(BATCH_EXTENSIONS):
+                continue
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self.journal.known_file(file_path, *signature):
+                continue
+            if self.candidates.get(file_path) == signature:
+                self.accept(file_path, *signature)
+            else:
+                # Übernommene Dateien bleiben draußen, sonst zählte status.json sie bis zum
+                # nächsten Durchlauf noch als wartend
+                candidates[file_path] = signature
+        self.candidates = candidates
+
+    def accept(self, file_path, size, mtime_ns):
+        try:
+            digest = file_sha256(file_path)
+        except OSError as e:
+            print(f"FEHLER {os.path.basename(file_path)}: {e}", file=sys.stderr)
+            return
+        existing = self.journal.job(digest)
+        if existing:
+            self.journal.remember_file(file_path, size, mtime_ns, digest)
+            self.duplicates += 1
+            print(f"DOPPELT {os.path.basename(file_path)} = {os.path.basename(existing[0])} ({existing[1]})")
+            return
+        # Erst den Auftrag, dann die Datei eintragen: Bricht das Programm dazwischen ab, wird
+        # die Datei beim Neustart erneut gehasht und als bekannt erkannt statt verloren zu gehen
+        queued_at = time.time()
+        self.journal.add(digest, file_path, queued_at)
+        self.journal.remember_file(file_path, size, mtime_ns, digest)
+        self.submit(digest, file_path, queued_at)
+
+    def submit(self, digest, file_path, queued_at):
+        try:
+            jobs = file_jobs(file_path, self.poppler_path, self.page_cache)
+        except Exception as e:
+            self.journal.finish(digest, time.time(), str(e))
+            print(f"FEHLER {os.path.basename(file_path)}: {e}", file=sys.stderr)
+            return
+        self.journal.start(digest, len(jobs))
+        self.active[digest] = {"path": file_path, "remaining": len(jobs), "errors": [], "queued_at": queued_at}
+        for job in jobs:
+            self.pool.apply_async(_process_batch_job, (job,),
+                                  callback=lambda result, digest=digest: self.results.put((digest, result)),
+                                  error_callback=lambda e, digest=digest, job=job:
+                                      self.results.put((digest, (job[0], job[1], str(e)))))
+
+    def drain(self):
+        while True:
+            try:
+                digest, (file_path, page, error) = self.results.get_nowait()
+            except queue.Empty:
+                return
+            now = time.time()
+            entry = self.active[digest]
+            entry["remaining"] -= 1
+            label = os.path.basename(file_path) + (f" Seite {page}" if page is not None else "")
+            if error:
+                entry["errors"].append(f"{label}: {error}")
+                print(f"FEHLER {label}: {error}", file=sys.stderr)
+            else:
+                self.pages_done += 1
+                self.finished_pages.append(now)
+                print(f"OK     {label}")
+            if entry["remaining"] == 0:
+                del self.active[digest]
+                self.journal.finish(digest, now, "; ".join(entry["errors"]) or None)
+                self.latencies.append(now - entry["queued_at"])
+
+    def metrics(self):
+        now = time.time()
+        while self.finished_pages and self.finished_pages[0] < now - 60:
+            self.finished_pages.popleft()
+        latencies = list(self.latencies)
+        counts = self.journal.counts()
+        return {
+            "timestamp": now,
+            "uptime_seconds": now - self.started,
+            "queue_depth_pages": sum(entry["remaining"] for entry in self.active.values()),
+            "files_in_progress": len(self.active),
+            "files_waiting": len(self.candidates),
+            "files_done": counts.get("done", 0),
+            "files_failed": counts.get("failed", 0),
+            "duplicates_skipped": self.duplicates,
+            "pages_done": self.pages_done,
+            "throughput_pages_per_second": len(self.finished_pages) / 60.0,
+            "latency_seconds": {
+                "last": latencies[-1] if latencies else None,
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "max": max(latencies) if latencies else None,
+            },
+        }
+
+    def poll(self):
+        self.drain()
+        self.scan()
+
+
+def write_json_atomic(file_path, data):
+    """Schreibt erst in eine temporäre Datei, damit Leser nie eine halbe Datei sehen."""
+    temp_path = file_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(temp_path, file_path)
+
+
+def run_watch(input_dir, output_dir, settings_path, workers=None, dpi=200, engine="Pillow", tile_mb=0,
+              threads=1, page_cache_dir=None, page_cache_mb=1024, grayscale=False, output_format="png",
+              interval=2.0, journal_path=None, metrics_path=None, export_options=None):
+    """Überwacht input_dir dauerhaft und verarbeitet neue Bilder/PDFs wie run_batch.
+    Das Journal (Standard: journal.sqlite im Ausgabeordner) sorgt dafür, dass nach einem
+    Neustart nichts doppelt gerechnet wird; Warteschlange, Latenz und Durchsatz stehen
+    laufend in metrics_path (Standard: status.json im Ausgabeordner). Ende mit Strg+C."""
+    poppler_path, layer_settings = load_settings_file(settings_path)
+    poppler_path = find_poppler_path(poppler_path)
+    layers = active_layers(layer_settings)
+    os.makedirs(output_dir, exist_ok=True)
+    page_cache = PageCache(page_cache_dir, page_cache_mb * 1024 * 1024) if page_cache_dir else None
+    journal = JobJournal(journal_path or os.path.join(output_dir, "journal.sqlite"))
+    metrics_path = metrics_path or os.path.join(output_dir, "status.json")
+
+    print(f"Überwache {input_dir} -> {output_dir} (Strg+C beendet)")
+    with multiprocessing.Pool(workers or os.cpu_count() or 1, initializer=_init_batch_worker,
+                              initargs=(layers, output_dir, poppler_path, dpi, engine, tile_mb * 1024 * 1024,
+                                        threads, page_cache_dir, page_cache_mb, grayscale, output_format,
+                                        export_options)) as pool:
+        watcher = WatchFolder(input_dir, output_dir, journal, pool, poppler_path, page_cache)
+        watcher.resume()
+        try:
+            while True:
+                watcher.poll()
+                write_json_atomic(metrics_path, watcher.metrics())
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("Beendet; offene Aufträge werden beim nächsten Start fortgesetzt.")
+        finally:
+            journal.close()
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# HTTP-Dienst
+# ---------------------------------------------------------------------------
+
+SERVICE_MAX_BYTES = 200 * 1024 * 1024  # größte angenommene Datei
+SERVICE_CHUNK_BYTES = 64 * 1024
+SERVICE_CONTENT_TYPES = {"png": "image/png", "tif": "image/tiff", "jpg": "image/jpeg", "pdf": "application/pdf"}
+
+
+class ServiceError(Exception):
+    """Fehler, der mit HTTP-Status und Meldung an den Aufrufer geht."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def spool_upload(data, suffix):
+    """Schreibt einen hochgeladenen Body in eine temporäre Datei und gibt deren Pfad zurück."""
+    import tempfile
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="bildprozessor_")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# Wird pro Worker-Prozess des Dienstes einmal durch _init_service_worker gesetzt
+_service_config = {}
+
+
+def _init_service_worker(engine="Pillow"):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _service_config.update(numpy_engine=NumpyEngine() if engine == "NumPy" else None)
+
+
+def _process_service_job(source, page, layers, dpi, grayscale, poppler_path, engine, tile_budget, output_format,
+                         options):
+    """Läuft im Worker-Prozess: ein Bild (source sind dessen Bytes) bzw. eine PDF-Seite (source
+    ist der Pfad der zwischengespeicherten PDF) dekodieren, filtern und gleich kodieren. Zurück
+    an den Hauptprozess gehen nur die kodierten Bytes – bei PDF und TIFF eine Seite für
+    PageWriter.add_encoded –, nicht das ganze Bild."""
+    if page is not None:
+        img = working_image(convert_from_path(source, dpi=dpi, first_page=page, last_page=page,
+                                              poppler_path=poppler_path or None, grayscale=grayscale)[0])
+    else:
+        data = source
+        img = working_image(Image.open(io.BytesIO(data)))
+    if tile_budget and needs_tiling(img, tile_budget):
+        img = process_tiled(img, layers, tile_budget)
+    else:
+        img = render_layers(img, layers, engine=engine, numpy_engine=_service_config.get("numpy_engine"))
+    page_dpi = dpi if page is not None else None
+    if "." + output_format in PAGE_FORMATS:
+        return encode_page(img, "." + output_format, options, page_dpi)
+    output = io.BytesIO()
+    save_output(img, output, output_format, options, page_dpi)
+    return output.getvalue()
+
+
+class ProcessingService:
+    """Nimmt Aufträge des HTTP-Servers an und rechnet sie auf einem begrenzten Prozess-Pool.
+
+    Höchstens max_pending Anfragen sind gleichzeitig in Arbeit oder warten auf den Pool; jede
+    weitere wird sofort mit 503 abgewiesen, statt sich unbegrenzt anzustauen. Dieselbe Grenze
+    gilt für die Seiten in der Warteschlange: Eine PDF wird nur angenommen, wenn alle ihre Seiten
+    noch hineinpassen (ein leerer Dienst nimmt sie immer), und hat sie mehr als max_pages Seiten,
+    wird sie mit 413 abgelehnt. Jede Anfrage hat
+    timeout Sekunden Zeit – die Seiten einer PDF laufen dabei gemeinsam als ein Stapel
+    auf dem Pool. Ein laufender Prozess lässt sich nicht abbrechen; Seiten, deren Anfrage
+    schon abgelaufen ist, zählen deshalb weiter zur Warteschlange, bis sie fertig sind.
+    """
+
+    def __init__(self, pool, presets, poppler_path="", max_pending=8, timeout=60.0, dpi=200, engine="Pillow",
+                 tile_budget=0, export_options=None, max_pages=100):
+        self.pool = pool
+        self.presets = presets
+        self.poppler_path = poppler_path
+        self.max_pending = max_pending
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.dpi = dpi
+        self.engine = engine
+        self.tile_budget = tile_budget
+        self.export_options = export_options
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.in_flight = 0
+        self.pages_queued = 0
+        self.counters = {"requests": 0, "ok": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+        self.latencies = deque(maxlen=1000)
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def acquire(self):
+        """Reserviert einen Platz oder wirft 503, wenn der Dienst ausgelastet ist."""
+        self.count("requests")
+        with self.lock:
+            backlog = self.pages_queued >= self.max_pending
+        if backlog or not self.slots.acquire(blocking=False):
+            self.count("rejected")
+            raise ServiceError(503, "Dienst ausgelastet, bitte später erneut versuchen.")
+        with self.lock:
+            self.in_flight += 1
+
+    def release(self, start, ok):
+        with self.lock:
+            self.in_flight -= 1
+            if ok:
+                self.latencies.append(time.perf_counter() - start)
+        self.slots.release()
+
+    def process(self, data, preset, page=None, output_format="png", grayscale=False):
+        """Rechnet data (Bild oder PDF) mit dem Preset und gibt die kodierten Bytes zurück."""
+        if preset not in self.presets:
+            raise ServiceError(404, f"Unbekanntes Preset: {preset}")
+        if output_format not in SERVICE_CONTENT_TYPES:
+            raise ServiceError(400, f"Unbekanntes Format: {output_format}")
+        layers = self.presets[preset]
+        deadline = time.monotonic() + self.timeout
+        if data[:5] == b"%PDF-":
+            # Die PDF landet einmal je Anfrage in einer Datei, aus der jeder Worker nur seine
+            # Seite liest, statt die ganzen Bytes für jede Seite in den Pool zu schicken
+            source = spool_upload(data, ".pdf")
+        else:
+            source = data
+        try:
+            pages = self.pdf_pages(source, page, output_format) if source is not data else [None]
+            with self.lock:
+                # Alle Seiten der Anfrage zählen gegen das Budget, nicht nur der Stand bei acquire
+                backlog = self.pages_queued and self.pages_queued + len(pages) > self.max_pending
+                if not backlog:
+                    self.pages_queued += len(pages)
+            if backlog:
+                self.count("rejected")
+                raise ServiceError(503, "Dienst ausgelastet, bitte später erneut versuchen.")
+        except BaseException:
+            if source is not data:
+                remove_file(source)
+            raise
+        finished = self.page_finished
+        if source is not data:
+            finished = self.countdown(len(pages), source)
+        results = [self.pool.apply_async(_process_service_job,
+                                         (source, p, layers, self.dpi, grayscale, self.poppler_path, self.engine,
+                                          self.tile_budget, output_format, self.export_options),
+                                         callback=finished, error_callback=finished)
+                   for p in pages]
+        if "." + output_format in PAGE_FORMATS:
+            # Die Worker haben schon kodiert; hier werden die Seiten in Reihenfolge nur noch
+            # zusammengefügt, sobald sie fertig sind
+            output = io.BytesIO()
+            dpi = self.dpi if pages != [None] else None
+            with PageWriter(output, output_format, self.export_options, dpi) as writer:
+                for result in results:
+                    writer.add_encoded(self.page_result(result, deadline))
+            body = output.getvalue()
+        else:
+            body = self.page_result(results[0], deadline)
+        if time.monotonic() > deadline:
+            self.count("timeouts")
+            raise ServiceError(504, f"Zeitlimit von {self.timeout:g} s überschritten.")
+        return body
+
+    def page_result(self, result, deadline):
+        try:
+            return result.get(max(0.0, deadline - time.monotonic()))
+        except multiprocessing.TimeoutError:
+            self.count("timeouts")
+            raise ServiceError(504, f"Zeitlimit von {self.timeout:g} s überschritten.")
+        except Exception as e:
+            raise ServiceError(422, f"Verarbeitung fehlgeschlagen: {e}")
+
+    def pdf_pages(self, path, page, output_format):
+        """Prüft die PDF unter path und gibt die zu rechnenden Seitennummern zurück."""
+        try:
+            page_count = pdfinfo_from_path(path, poppler_path=self.poppler_path or None)["Pages"]
+        except Exception as e:
+            raise ServiceError(422, f"PDF nicht lesbar: {e}")
+        pages = [page] if page else list(range(1, page_count + 1))
+        if any(not 1 <= p <= page_count for p in pages):
+            raise ServiceError(400, f"Die PDF hat nur {page_count} Seiten.")
+        if len(pages) > 1 and "." + output_format not in PAGE_FORMATS:
+            raise ServiceError(400, "Mehrere Seiten gehen nur als format=tif, format=pdf oder mit page=N.")
+        if len(pages) > self.max_pages:
+            raise ServiceError(413, f"Die PDF hat {len(pages)} Seiten, höchstens {self.max_pages} je Anfrage.")
+        return pages
+
+    def page_finished(self, result):
+        with self.lock:
+            self.pages_queued -= 1
+
+    def countdown(self, count, path):
+        """Callback für die count Seiten einer Anfrage, der path löscht, sobald die letzte
+        fertig ist – auch wenn die Anfrage selbst schon mit 504 beantwortet wurde."""
+        remaining = [count]
+
+        def finished(result):
+            self.page_finished(result)
+            with self.lock:
+                remaining[0] -= 1
+                done = not remaining[0]
+            if done:
+                remove_file(path)
+        return finished
+
+    def metrics(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            counters = dict(self.counters)
+            in_flight = self.in_flight
+            pages_queued = self.pages_queued
+        return {
+            "uptime_seconds": time.time() - self.started,
+            "in_flight": in_flight,
+            "queue_depth_pages": pages_queued,
+            "capacity": self.max_pending,
+            "requests": counters,
+            "latency_seconds": {
+                "p50": percentile(latencies, 50),
+                "p90": percentile(latencies, 90),
+                "p99": percentile(latencies, 99),
+                "max": max(latencies) if latencies else None,
+                "samples": len(latencies),
+            },
+        }
+
+
+@functools.lru_cache(maxsize=1)
+def service_handler_class():
+    """Baut ServiceHandler erst beim Start des Dienstes; http.server lädt sonst bei jedem
+    Programmstart einen großen Teil der E-Mail- und SSL-Module mit."""
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import parse_qs, urlparse
+
+    class ServiceHandler(BaseHTTPRequestHandler):
+        """POST /process?preset=NAME&format=png|tif|jpg&page=N&grayscale=1 mit der Datei als Body,
+        GET /metrics, /presets und /health."""
+
+        protocol_version = "HTTP/1.1"
+
+        def send_body(self, status, body, content_type, headers=()):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            if self.close_connection:
+                self.send_header("Connection", "close")
+            self.end_headers()
+            # In Stücken schreiben, damit große Ergebnisse nicht als ein Block im Socketpuffer liegen
+            view = memoryview(body)
+            for offset in range(0, len(body), SERVICE_CHUNK_BYTES):
+                self.wfile.write(view[offset:offset + SERVICE_CHUNK_BYTES])
+
+        def send_json(self, status, data, headers=()):
+            self.send_body(status, json.dumps(data, indent=4).encode("utf-8"), "application/json", headers)
+
+        def do_GET(self):
+            service = self.server.service
+            path = urlparse(self.path).path
+            if path == "/metrics":
+                self.send_json(200, service.metrics())
+            elif path == "/presets":
+                self.send_json(200, {name: [list(layer) for layer in layers] for name, layers in service.presets.items()})
+            elif path == "/health":
+                self.send_json(200, {"status": "ok"})
+            else:
+                self.send_json(404, {"error": "Unbekannter Pfad"})
+
+        def do_POST(self):
+            service = self.server.service
+            url = urlparse(self.path)
+            if url.path != "/process":
+                # Der Body bleibt ungelesen und würde sonst als nächste Anfrage gelesen
+                self.close_connection = True
+                self.send_json(404, {"error": "Unbekannter Pfad"})
+                return
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            start = time.perf_counter()
+            ok = False
+            length = 0
+            data = None
+            try:
                 try:
-                    self.processed_image.save(file_path)
-                    messagebox.showinfo("Erfolg", "Bild erfolgreich gespeichert.")
-                except Exception as e:
-                    messagebox.showerror("Fehler", f"Speichern fehlgeschlagen: {str(e)}")
+                    length = int(self.headers.get("Content-Length", 0))
+                except ValueError:
+                    self.close_connection = True  # Länge unbekannt, der Body lässt sich nicht überspringen
+                    raise ServiceError(400, "Content-Length ist keine Zahl.")
+                if length <= 0:
+                    raise ServiceError(411, "Content-Length fehlt.")
+                if length > SERVICE_MAX_BYTES:
+                    self.close_connection = True
+                    raise ServiceError(413, "Datei zu groß.")
+                service.acquire()
+                try:
+                    data = self.rfile.read(length)
+                    output_format = query.get("format", "png")
+                    body = service.process(data, query.get("preset", "standard"),
+                                           int(query["page"]) if "page" in query else None,
+                                           output_format, query.get("grayscale") in ("1", "true"))
+                    ok = True
+                finally:
+                    service.release(start, ok)
+                service.count("ok")
+                self.send_body(200, body, SERVICE_CONTENT_TYPES[output_format],
+                               [("X-Processing-Seconds", f"{time.perf_counter() - start:.3f}")])
+            except ServiceError as e:
+                if e.status == 503:
+                    # Body lesen und verwerfen, sonst sieht der Client statt der 503 einen Verbindungsabbruch
+                    if data is None:
+                        for offset in range(0, length, SERVICE_CHUNK_BYTES):
+                            self.rfile.read(min(SERVICE_CHUNK_BYTES, length - offset))
+                elif e.status != 504:
+                    # 504 zählt schon als "timeouts"
+                    service.count("errors")
+                self.send_json(e.status, {"error": str(e)}, [("Retry-After", "1")] if e.status == 503 else ())
+            except ValueError as e:
+                service.count("errors")
+                self.send_json(400, {"error": str(e)})
+
+    return ServiceHandler
+
+
+def load_presets(settings_path, presets_dir=None):
+    """Presets für den Dienst: settings_path als "standard" und jede *.json aus presets_dir
+    unter ihrem Dateinamen. Liefert (Poppler-Pfad, {Name: Ebenen})."""
+    poppler_path, layer_settings = load_settings_file(settings_path)
+    presets = {"standard": active_layers(layer_settings)}
+    if presets_dir:
+        for name in sorted(os.listdir(presets_dir)):
+            if name.lower().endswith(".json"):
+                _, layer_settings = load_settings_file(os.path.join(presets_dir, name))
+                presets[os.path.splitext(name)[0]] = active_layers(layer_settings)
+    return poppler_path, presets
+
+
+def run_service(address, settings_path, presets_dir=None, workers=None, max_pending=None, timeout=60.0, dpi=200,
+                engine="Pillow", tile_mb=0, export_options=None, max_pages=100):
+    """Startet den HTTP-Dienst auf address ("host:port" oder nur Port, Standard localhost)."""
+    host, _, port = address.rpartition(":")
+    poppler_path, presets = load_presets(settings_path, presets_dir)
+    poppler_path = find_poppler_path(poppler_path)
+    workers = workers or os.cpu_count() or 1
+    with multiprocessing.Pool(workers, initializer=_init_service_worker, initargs=(engine,)) as pool:
+        service = ProcessingService(pool, presets, poppler_path, max_pending or 2 * workers, timeout, dpi, engine,
+                                    tile_mb * 1024 * 1024, export_options, max_pages)
+        from http.server import ThreadingHTTPServer
+        server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), service_handler_class())
+        server.daemon_threads = True
+        server.service = service
+        print(f"Dienst läuft auf http://{server.server_address[0]}:{server.server_address[1]}/ "
+              f"({workers} Prozesse, Presets: {', '.join(presets)}; Strg+C beendet)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("Beendet.")
+        finally:
+            server.server_close()
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bildprozessor Pro")
+    parser.add_argument("--batch", nargs=2, metavar=("EINGABE", "AUSGABE"),
+                        help="Alle Bilder/PDFs aus EINGABE ohne GUI verarbeiten und nach AUSGABE schreiben")
+    parser.add_argument("--watch", nargs=2, metavar=("EINGANG", "AUSGANG"),
+                        help="EINGANG dauerhaft überwachen und neue Bilder/PDFs nach AUSGANG verarbeiten")
+    parser.add_argument("--interval", type=float, default=2.0,
+                        help="Sekunden zwischen zwei Durchläufen im Überwachungsbetrieb (Standard: 2)")
+    parser.add_argument("--journal", help="SQLite-Journal für --watch (Standard: journal.sqlite im Ausgang)")
+    parser.add_argument("--metrics", help="Statusdatei für --watch (Standard: status.json im Ausgang)")
+    parser.add_argument("--serve", metavar="[HOST:]PORT",
+                        help="Als lokaler HTTP-Dienst laufen (POST /process, GET /metrics), z.B. --serve 8080")
+    parser.add_argument("--presets", metavar="ORDNER",
+                        help="Weitere Presets für --serve: jede *.json im Ordner unter ihrem Dateinamen")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="Gleichzeitige Anfragen und wartende Seiten für --serve, darüber gibt es 503 "
+                             "(Standard: 2 × Prozesse)")
+    parser.add_argument("--max-pages", type=int, default=100,
+                        help="Höchstens so viele PDF-Seiten je Anfrage für --serve, sonst 413 (Standard: 100)")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="Zeitlimit je Anfrage in Sekunden für --serve (Standard: 60)")
+    parser.add_argument("--settings", default=os.path.join(get_program_path(), "settings.json"),
+                        help="Einstellungsdatei mit den Filterebenen (Standard: settings.json im Programmordner)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Anzahl paralleler Prozesse (Standard: Anzahl CPU-Kerne)")
+    parser.add_argument("--dpi", type=int, default=200, help="Auflösung für PDF-Seiten (Standard: 200)")
+    parser.add_argument("--engine", choices=ENGINES, default="Pillow",
+                        help="Filter-Engine für den Batch-Betrieb (NumPy benötigt numpy)")
+    parser.add_argument("--tile-mb", type=int, default=0,
+                        help="Speicherbudget je Seite in MB; größere Seiten werden gekachelt verarbeitet (0 = aus)")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="Threads je Seite für die Streifen-Parallelisierung (Standard: 1)")
+    parser.add_argument("--page-cache", metavar="ORDNER",
+                        help="Gerasterte PDF-Seiten in ORDNER zwischenspeichern (Schlüssel: Dateiinhalt, Seite, DPI)")
+    parser.add_argument("--page-cache-mb", type=int, default=1024,
+                        help="Höchstgröße des Seiten-Caches in MB (Standard: 1024)")
+    parser.add_argument("--grayscale", action="store_true",
+                        help="PDF-Seiten in Graustufen rastern (schneller und kleiner bei Scans und Faxen)")
+    parser.add_argument("--format", choices=BATCH_FORMATS, default="png",
+                        help="Ausgabeformat; Schwarz/Weiß-Ergebnisse werden als tif mit CCITT Group 4 gespeichert")
+    parser.add_argument("--png-level", type=int, choices=range(10), metavar="0-9",
+                        help="PNG-Kompressionsstufe: 0 schnell und groß, 9 langsam und klein (Standard: 6)")
+    parser.add_argument("--jpeg-quality", type=int, choices=range(1, 96), metavar="1-95",
+                        help="JPEG-Qualität, auch für Graustufen- und Farbseiten in PDFs (Standard: 75)")
+    parser.add_argument("--tiff-codec", choices=TIFF_CODECS,
+                        help="Kompression für TIFF-Seiten, die nicht reines Schwarz/Weiß sind (Standard: tiff_lzw)")
+    parser.add_argument("--startup-profile", nargs="?", const="-", metavar="DATEI",
+                        help="Zeiten für Importe und Aufbau bis zum sichtbaren Fenster ausgeben; "
+                             "mit DATEI zusätzlich als JSON-Zeile anhängen")
+    return parser.parse_args(argv)
+
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    args = parse_args()
+    export = {name: value for name, value in (("png_level", args.png_level), ("jpeg_quality", args.jpeg_quality),
+                                              ("tiff_codec", args.tiff_codec)) if value is not None}
+    if args.batch or args.watch or args.serve:
+        if args.engine == "NumPy" and not NUMPY_AVAILABLE:
+            sys.exit("Die NumPy-Engine benötigt numpy (pip install numpy).")
+    if args.serve:
+        sys.exit(run_service(args.serve, args.settings, args.presets, args.workers, args.max_pending, args.timeout,
+                             args.dpi, args.engine, args.tile_mb, export, args.max_pages))
+    if args.watch:
+        sys.exit(run_watch(args.watch[0], args.watch[1], args.settings, args.workers, args.dpi, args.engine,
+                           args.tile_mb, args.threads, args.page_cache, args.page_cache_mb, args.grayscale,
+                           args.format, args.interval, args.journal, args.metrics, export))
+    if args.batch:
+        sys.exit(run_batch(args.batch[0], args.batch[1], args.settings, args.workers, args.dpi, args.engine,
+                           args.tile_mb, args.threads, args.page_cache, args.page_cache_mb, args.grayscale,
+                           args.format, export))
     root = tk.Tk()
+    startup_mark("Tk")
     app = ImageProcessorApp(root)
+    if args.startup_profile:
+        def window_mapped(event):
+            if event.widget is root:  # <Map> kommt auch für jedes Kind-Widget
+                root.unbind("<Map>")
+                startup_mark("Fenster sichtbar")
+                root.after_idle(report_startup, args.startup_profile)
+        root.bind("<Map>", window_mapped)
     root.mainloop()
@@ -0,0 +1,251 @@
+"""Benchmark für Bildprozessor Pro – läuft ohne Tk-Fenster.
+
+Erzeugt synthetische, scanähnliche Seiten in mehreren Größen (RGB und Graustufen), misst
+jeden der 20 Filter einzeln und die mitgelieferte Voreinstellung Einstellung.json als Stapel
+und speichert Laufzeit, Speicherhöchststand (RSS) und Pillow-Allokationen als JSON.
+
+    python benchmark.py --output ergebnis.json
+    python benchmark.py --sizes 1 4 --baseline basis.json --threshold 0.15
+
+Mit --baseline wird gegen eine frühere Messung verglichen; Fälle, die um mehr als
+--threshold langsamer geworden sind, werden gemeldet und der Rückgabewert ist 1.
+"""
+from PIL import Image, ImageChops, ImageDraw, ImageOps
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+
+import Bildprozessor_Pro as bp
+
+try:
+    import psutil  # Optional, sonst wird /proc/self/statm gelesen
+except ImportError:
+    psutil = None
+
+
+def current_rss():
+    """Aktueller Arbeitsspeicher des Prozesses in Byte oder None, wenn nicht ermittelbar."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class PeakRssSampler:
+    """Misst im Hintergrund alle paar Millisekunden den RSS und merkt sich das Maximum."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = current_rss()
+        self.running = False
+
+    def _run(self):
+        while self.running:
+            rss = current_rss()
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+
+def synthetic_scan(megapixels, mode="RGB", seed=0):
+    """Scanähnliche Seite im A4-Format: Papierton, ungleichmäßige Ausleuchtung, Rauschen
+    und Textzeilen aus dunklen Wortblöcken. Mit festem seed immer gleich."""
+    rng = random.Random(seed)
+    height = int((megapixels * 1_000_000 * 297 / 210) ** 0.5)
+    width = int(megapixels * 1_000_000 / height)
+    page = Image.new("L", (width, height), 235)
+    draw = ImageDraw.Draw(page)
+    line_height = max(4, height // 120)
+    for top in range(line_height * 3, height - line_height * 3, line_height * 2):
+        x = width // 12
+        while x < width - width // 12:
+            word = rng.randint(line_height, line_height * 5)
+            draw.rectangle((x, top, min(x + word, width - width // 12), top + line_height),
+                           fill=rng.randint(20, 90))
+            x += word + line_height
+    shading = Image.linear_gradient("L").rotate(35).resize((width, height)).point(lambda v: 255 - v // 4)
+    page = ImageChops.multiply(page, shading)
+    page = ImageChops.add(page, Image.effect_noise((width, height), 10), offset=-128)
+    if mode == "RGB":
+        page = ImageOps.colorize(page, "#101010", "#F4EEDC")
+    return page
+
+
+def prepare(img):
+    # Wie load_image: Graustufen-Scans bleiben "L", alles andere wird RGB
+    return bp.working_image(img)
+
+
+def measure(func, repeat):
+    """Führt func repeat-mal aus und liefert Zeiten, RSS-Spitze und Pillow-Allokationen."""
+    times = []
+    stats_before = Image.core.get_stats()
+    with PeakRssSampler() as sampler:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+    stats_after = Image.core.get_stats()
+    return {
+        "seconds": statistics.median(times),
+        "min_seconds": min(times),
+        "peak_rss_mb": sampler.peak / 1048576 if sampler.peak is not None else None,
+        "pillow_images": (stats_after["new_count"] - stats_before["new_count"]) / repeat,
+        "pillow_blocks": (stats_after["allocated_blocks"] + stats_after["reused_blocks"]
+                          - stats_before["allocated_blocks"] - stats_before["reused_blocks"]) / repeat,
+    }
+
+
+def load_preset(path):
+    """Liest Einstellung.json (Liste von Ebenen) oder eine settings.json."""
+    with open(path, "r") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("layers", [])
+    return bp.active_layers(data)
+
+
+def run_benchmarks(sizes, modes, preset, repeat, engine, strength=0.5):
+    results = []
+    for megapixels in sizes:
+        for mode in modes:
+            img = prepare(synthetic_scan(megapixels, mode))
+            cases = [(name, [(name, strength)]) for name in bp.FILTER_OPTIONS]
+            cases.append(("Voreinstellung", preset))
+            for name, layers in cases:
+                case = f"{megapixels}MP-{mode}/{name}"
+                try:
+                    result = measure(lambda img=img, layers=layers: bp.render_layers(img, layers, engine=engine), repeat)
+                except Exception as e:
+                    result = {"error": str(e)}
+                result.update(case=case, megapixels=megapixels, mode=mode, name=name)
+                results.append(result)
+                if "error" in result:
+                    print(f"{case:40s} FEHLER: {result['error']}")
+                else:
+                    print(f"{case:40s} {result['seconds'] * 1000:9.1f} ms  RSS {result['peak_rss_mb'] or 0:7.0f} MB")
+            del img
+    return results
+
+
+def run_scaling(sizes, modes, thread_counts, repeat, strength=0.5):
+    """Misst jeden Filter mit StripPool bei verschiedenen Thread-Zahlen; Speedup gegenüber 1 Thread."""
+    results = []
+    for megapixels in sizes:
+        for mode in modes:
+            img = prepare(synthetic_scan(megapixels, mode))
+            for name in bp.FILTER_OPTIONS:
+                layers = [(name, strength)]
+                baseline = None
+                line = f"{megapixels}MP-{mode}/{name}"
+                for threads in thread_counts:
+                    pool = bp.StripPool(threads)
+                    try:
+                        seconds = measure(lambda img=img, layers=layers, pool=pool: bp.apply_layers(img, layers, pool=pool),
+                                          repeat)["seconds"]
+                    finally:
+                        pool.shutdown()
+                    if baseline is None:
+                        baseline = seconds
+                    speedup = baseline / seconds if seconds > 0 else 0.0
+                    results.append({"case": f"{megapixels}MP-{mode}/{name}", "threads": threads,
+                                    "seconds": seconds, "speedup": speedup})
+                    line += f"  {threads}T {speedup:4.1f}x"
+                print(line)
+            del img
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Vergleicht mit einer gespeicherten Messung; liefert die Liste der Verschlechterungen."""
+    old = {r["case"]: r for r in baseline.get("results", []) if "seconds" in r}
+    regressions = []
+    for result in results:
+        before = old.get(result["case"])
+        if before is None or "seconds" not in result or before["seconds"] <= 0:
+            continue
+        ratio = result["seconds"] / before["seconds"]
+        if ratio > 1 + threshold:
+            regressions.append((result["case"], before["seconds"], result["seconds"], ratio))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark der Filter von Bildprozessor Pro")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 4, 16, 64], help="Bildgrößen in Megapixeln")
+    parser.add_argument("--modes", nargs="+", default=["RGB", "L"], choices=["RGB", "L"])
+    parser.add_argument("--preset", default=os.path.join(bp.get_program_path(), "Einstellung.json"),
+                        help="Voreinstellung, die als Stapel gemessen wird")
+    parser.add_argument("--repeat", type=int, default=3, help="Wiederholungen je Fall (Median zählt)")
+    parser.add_argument("--engine", choices=bp.ENGINES, default="Pillow")
+    parser.add_argument("--output", default="benchmark.json", help="Ergebnisdatei (JSON)")
+    parser.add_argument("--baseline", help="Frühere Ergebnisdatei zum Vergleich")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Erlaubte Verlangsamung gegenüber der Basis (0.10 = 10 %%)")
+    parser.add_argument("--scaling", type=int, nargs="+", metavar="THREADS",
+                        help="Statt der Einzelmessung die Skalierung je Filter über diese Thread-Zahlen messen, "
+                             "z.B. --scaling 1 2 4 8 16")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.scaling:
+        thread_counts = sorted(set([1] + args.scaling))
+        with open(args.output, "w") as f:
+            json.dump({"meta": {"cpu_count": os.cpu_count(), "pillow": Image.__version__},
+                       "scaling": run_scaling(args.sizes, args.modes, thread_counts, args.repeat)}, f, indent=4)
+        print(f"Ergebnisse gespeichert in {args.output}")
+        return 0
+    results = run_benchmarks(args.sizes, args.modes, load_preset(args.preset), args.repeat, args.engine)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "pillow": Image.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "engine": args.engine,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Ergebnisse gespeichert in {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for case, before, after, ratio in regressions:
+            print(f"LANGSAMER {case}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms ({(ratio - 1) * 100:+.0f} %)")
+        if regressions:
+            return 1
+        print(f"Keine Verschlechterung über {args.threshold * 100:.0f} %.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())